@@ -8,10 +8,11 @@ from flask import Flask
 from flask_cors import CORS
 
 from config import Config
-from database import init_database, close_database
+from database import init_database, close_database, has_unique_index
 from routes.simple_api import simple_api_bp
 from routes.packages import packages_bp
 from routes.api import api_bp
+from utils.json_provider import ORJSONProvider, HAS_ORJSON
 
 # Initialize logging
 Config.init_logging()
@@ -23,6 +24,10 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # Faster JSON encoding for jsonify() when orjson is installed
+    if HAS_ORJSON:
+        app.json = ORJSONProvider(app)
+
     # Enable CORS
     CORS(app)
 
@@ -38,6 +43,13 @@ def create_app():
         logger.error("Failed to initialize database")
         raise RuntimeError("Database initialization failed")
 
+    if not has_unique_index():
+        logger.error(
+            "Unique index 'uq_packages_name_version' is missing or invalid; "
+            "run migrations/002_add_package_version_unique.py before starting the service"
+        )
+        raise RuntimeError("Database schema is out of date")
+
     # Register blueprints
     app.register_blueprint(simple_api_bp)  # /simple/ - PyPI Simple API (security gatekeeper)
     app.register_blueprint(packages_bp)    # /packages/ - Package file downloads
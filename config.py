@@ -24,12 +24,32 @@ class Config:
     SQLALCHEMY_DATABASE_URI = SUPABASE_DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = FLASK_ENV == 'development'
+    # Connections kept open per process (0 = open a new connection per session)
+    DB_POOL_SIZE = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_DB_MAX_OVERFLOW', '10'))
 
     # PyPI Server
     PYPI_SERVER_URL = os.getenv(
         'HYPERPLANE_CUSTOM_SECRET_KEY_PYPI_SERVER_URL',
         'http://pypiserver-pypiserver.hyperplane-pypiserver.svc.cluster.local:8080'
     )
+    # Optional local mount of the PyPI server's package directory; files found
+    # there are served directly instead of being proxied over HTTP
+    PYPI_PACKAGES_DIR = os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_PYPI_PACKAGES_DIR')
+    # Seconds to cache successful PyPI lookups in-process (0 disables)
+    PYPI_CACHE_TTL = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_PYPI_CACHE_TTL', '120'))
+    PYPI_CACHE_SIZE = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_PYPI_CACHE_SIZE', '4096'))
+    # Packages whose JSON API summary (info fields and version list) is cached per worker
+    PACKAGE_SUMMARY_CACHE_SIZE = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_PACKAGE_SUMMARY_CACHE_SIZE', '256'))
+    # Seconds to remember that the PyPI server returned 404 for a package (0 disables);
+    # kept short since the package appears there as soon as its scan passes
+    PYPI_NEGATIVE_CACHE_TTL = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_PYPI_NEGATIVE_CACHE_TTL', '10'))
+    # Seconds to cache /simple/<name>/ pages that returned 200 (0 disables); kept
+    # as short as the 404 cache, since a version uploaded after its scan must
+    # show up on the page before pip gives up with "no matching distribution"
+    SIMPLE_PAGE_CACHE_TTL = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_SIMPLE_PAGE_CACHE_TTL', '10'))
+    # Seconds to cache terminal (vulnerable) scan statuses in-process (0 disables)
+    STATUS_CACHE_TTL = int(os.getenv('HYPERPLANE_CUSTOM_SECRET_KEY_STATUS_CACHE_TTL', '30'))
     
     # Hyperplane API
     HYPERPLANE_GRAPHQL_URL = os.getenv(
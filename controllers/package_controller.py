@@ -4,9 +4,11 @@ Package controller for handling HTTP requests
 
 import logging
 from typing import Optional
-from flask import Response, jsonify
+from flask import Response, jsonify, request
+from werkzeug.wsgi import wrap_file
 from services.package_service import PackageService
 from repositories.package_repository import PackageRepository
+from models.package import PackageStatus
 from flask import g
 
 logger = logging.getLogger(__name__)
@@ -51,44 +53,41 @@ class PackageController:
             503 - Package is pending scan or being scanned
         """
         try:
-            logger.info(f"📦 Request: package={package_name}, version={version}, python={python_version}")
+            logger.debug(f"📦 Request: package={package_name}, version={version}, python={python_version}")
 
             # Check PyPI server first
-            logger.info(f"🔍 Step 1: Checking internal PyPI for '{package_name}'")
+            logger.debug(f"🔍 Step 1: Checking internal PyPI for '{package_name}'")
             available, content, headers = self.package_service.check_pypi_availability(package_name)
 
             if available:
-                logger.info(f"✅ Package '{package_name}' found on internal PyPI → Returning 200")
+                logger.info(f"✅ {package_name}: found on internal PyPI → Returning 200")
                 return Response(content, status=200, headers=headers)
 
             # Not on PyPI - check database for status
-            logger.info(f"🔍 Step 2: Not on internal PyPI, checking database")
+            logger.debug(f"🔍 Step 2: Not on internal PyPI, checking database")
             status, vuln_info = self.package_service.check_package_status(package_name, version)
-            logger.info(f"📊 Database status: '{status}'")
+            logger.debug(f"📊 Database status: '{status}'")
 
             # Use enum values
-            from models.package import PackageStatus
-
             if status == PackageStatus.COMPLETED.value:
                 # Package scanned and uploaded to internal PyPI
-                logger.info(f"✅ Status COMPLETED → Returning 200")
+                logger.info(f"✅ {package_name}: status COMPLETED → Returning 200")
                 return Response(content, status=200, headers=headers)
 
             elif status == PackageStatus.VULNERABLE.value:
-                logger.warning(f"⛔ Status VULNERABLE → Returning 403")
+                logger.warning(f"⛔ {package_name}: status VULNERABLE → Returning 403")
                 return self._respond_vulnerable(package_name, vuln_info)
 
-            elif status in [PackageStatus.PENDING.value, PackageStatus.DOWNLOADED.value]:
-                logger.info(f"⏳ Status {status.upper()} → Returning 503")
+            elif status in [PackageStatus.PENDING.value, PackageStatus.DISPATCHED.value, PackageStatus.DOWNLOADED.value]:
+                logger.info(f"⏳ {package_name}: status {status.upper()} → Returning 503")
                 return self._respond_pending(package_name)
 
             else:  # unknown or error states
-                # Add package for scanning with version info
-                logger.info(f"➕ Status '{status}', adding for scanning")
-                self.package_service.add_package_for_scanning(
+                # Add package for scanning with version info (written in the background)
+                self.package_service.queue_package_for_scanning(
                     package_name, version, python_version
                 )
-                logger.info(f"⏳ Returning 503 (scan pending)")
+                logger.info(f"⏳ {package_name}: status '{status}', queued for scanning → Returning 503")
                 return self._respond_pending(package_name)
 
         except Exception as e:
@@ -146,13 +145,21 @@ class PackageController:
     # API endpoints for package information
     # -----------------------
 
-    def list_all_packages(self) -> Response:
-        """List all packages in database"""
+    def list_all_packages(self, limit: int, cursor: Optional[str] = None) -> Response:
+        """List one page of packages in database (keyset pagination)"""
         try:
-            packages = self.package_service.get_all_packages()
+            try:
+                packages, next_cursor = self.package_service.get_all_packages(limit, cursor)
+            except (ValueError, OverflowError):
+                return jsonify({
+                    "error": "Invalid cursor",
+                    "details": "Use the 'next' value from a previous page"
+                }), 400
+
             return jsonify({
                 "total": len(packages),
-                "packages": packages
+                "packages": packages,
+                "next": next_cursor
             }), 200
         except Exception as e:
             logger.error(f"Error listing packages: {e}", exc_info=True)
@@ -161,6 +168,21 @@ class PackageController:
                 "details": str(e)
             }), 500
 
+    def export_packages_csv(self) -> Response:
+        """Stream every package in database as CSV"""
+        out = self.package_service.export_packages_csv()
+        if out is None:
+            return jsonify({"error": "Failed to export packages"}), 500
+
+        response = Response(
+            wrap_file(request.environ, out),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=packages.csv'},
+            direct_passthrough=True
+        )
+        response.call_on_close(out.close)
+        return response
+
     def list_pending_packages(self) -> Response:
         """List pending packages"""
         try:
@@ -4,7 +4,7 @@ Database connection and session management
 
 import logging
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import NullPool
 
@@ -13,25 +13,44 @@ from models.package import Base
 
 logger = logging.getLogger(__name__)
 
-# Global session factory
+# Global engine and session factory
+_engine = None
 _session_factory = None
 
+# Valid unique index behind PackageRepository's ON CONFLICT (package_name, version);
+# no row means it is missing (migration 002 not applied)
+UNIQUE_INDEX_CHECK = text(
+    "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('uq_packages_name_version')"
+)
+
 
 def init_database():
     """Initialize database engine and create tables"""
-    global _session_factory
+    global _engine, _session_factory
 
     try:
+        if Config.DB_POOL_SIZE > 0:
+            # Keep connections open between requests so concurrent request
+            # threads don't each pay connection setup
+            pool_options = {
+                'pool_size': Config.DB_POOL_SIZE,
+                'max_overflow': Config.DB_MAX_OVERFLOW
+            }
+        else:
+            pool_options = {'poolclass': NullPool}  # For serverless/short-lived environments
+
         engine = create_engine(
             Config.DATABASE_URL,
-            poolclass=NullPool,  # Use NullPool for serverless/container environments
             echo=Config.SQLALCHEMY_ECHO,
-            pool_pre_ping=True  # Verify connections before using
+            pool_pre_ping=True,  # Verify connections before using
+            **pool_options
         )
 
         # Create tables if they don't exist
         Base.metadata.create_all(engine)
 
+        _engine = engine
+
         # Create session factory
         _session_factory = scoped_session(
             sessionmaker(bind=engine, autocommit=False, autoflush=False)
@@ -45,6 +64,26 @@ def init_database():
         return False
 
 
+def has_unique_index():
+    """
+    Check that the index behind ON CONFLICT (package_name, version) exists
+
+    create_all doesn't add constraints to an existing table, so databases
+    created before migration 002 lack it and every queued insert fails.
+    Checked by the app at startup, not in init_database(), so migrations
+    can still connect to a database that needs them.
+    """
+    with get_engine().connect() as conn:
+        return bool(conn.execute(UNIQUE_INDEX_CHECK).scalar())
+
+
+def get_engine():
+    """Get database engine"""
+    if _engine is None:
+        init_database()
+    return _engine
+
+
 def get_session():
     """Get database session"""
     if _session_factory is None:
@@ -0,0 +1,107 @@
+"""
+Migration: Add unique constraint on (package_name, version)
+
+Adds:
+- uq_packages_name_version: unique index backing the
+  INSERT ... ON CONFLICT (package_name, version) used when queueing packages
+
+Duplicate rows must be resolved first; the migration lists them and stops
+if any exist.
+
+Usage:
+    python migrations/002_add_package_version_unique.py
+"""
+
+import sys
+import os
+import logging
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import get_engine
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Run the migration to add the unique index"""
+    try:
+        engine = get_engine()
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            logger.info("Starting migration: Add unique constraint on (package_name, version)")
+
+            # Check for duplicates that would make the index build fail
+            result = conn.execute(text("""
+                SELECT package_name, version, count(*)
+                FROM packages
+                GROUP BY package_name, version
+                HAVING count(*) > 1
+            """))
+
+            duplicates = result.fetchall()
+            if duplicates:
+                for package_name, version, count in duplicates:
+                    logger.error(f"Duplicate rows: {package_name}=={version} ({count} rows)")
+                logger.error("Resolve duplicate packages before running this migration")
+                return False
+
+            logger.info("Creating 'uq_packages_name_version' index...")
+            conn.execute(text("""
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_packages_name_version
+                ON packages (package_name, version)
+            """))
+            logger.info("✓ Index 'uq_packages_name_version' is in place")
+
+            logger.info("Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}", exc_info=True)
+        return False
+
+
+def rollback_migration():
+    """Rollback the migration (drop the unique index)"""
+    try:
+        engine = get_engine()
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            logger.info("Starting rollback: Remove unique constraint on (package_name, version)")
+
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS uq_packages_name_version"))
+            logger.info("✓ Removed 'uq_packages_name_version' index")
+
+            logger.info("Rollback completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"Rollback failed: {e}", exc_info=True)
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database migration for the package/version unique constraint')
+    parser.add_argument('--rollback', action='store_true', help='Rollback the migration')
+    args = parser.parse_args()
+
+    # Validate config
+    try:
+        Config.validate()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        sys.exit(1)
+
+    if args.rollback:
+        success = rollback_migration()
+    else:
+        success = run_migration()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,89 @@
+"""
+Migration: Add index for paginating packages by creation time
+
+Adds:
+- idx_packages_created_at_id: index on (created_at, id) backing the
+  newest-first keyset pagination of GET /api/db/packages
+
+Usage:
+    python migrations/003_add_created_at_index.py
+"""
+
+import sys
+import os
+import logging
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import get_engine
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Run the migration to add the pagination index"""
+    try:
+        engine = get_engine()
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            logger.info("Starting migration: Add index on (created_at, id)")
+
+            logger.info("Creating 'idx_packages_created_at_id' index...")
+            conn.execute(text("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_packages_created_at_id
+                ON packages (created_at, id)
+            """))
+            logger.info("✓ Index 'idx_packages_created_at_id' is in place")
+
+            logger.info("Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}", exc_info=True)
+        return False
+
+
+def rollback_migration():
+    """Rollback the migration (drop the pagination index)"""
+    try:
+        engine = get_engine()
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            logger.info("Starting rollback: Remove index on (created_at, id)")
+
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_packages_created_at_id"))
+            logger.info("✓ Removed 'idx_packages_created_at_id' index")
+
+            logger.info("Rollback completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"Rollback failed: {e}", exc_info=True)
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database migration for the created_at pagination index')
+    parser.add_argument('--rollback', action='store_true', help='Rollback the migration')
+    args = parser.parse_args()
+
+    # Validate config
+    try:
+        Config.validate()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        sys.exit(1)
+
+    if args.rollback:
+        success = rollback_migration()
+    else:
+        success = run_migration()
+
+    sys.exit(0 if success else 1)
@@ -0,0 +1,104 @@
+"""
+Migration: Add partial index for the scheduler's pending queue
+
+Adds:
+- idx_packages_pending_created_id: index on (created_at, id) over pending
+  rows, backing the ordered FOR UPDATE SKIP LOCKED claim in
+  process_pending_packages.py
+
+Removes:
+- idx_packages_pending_created: the earlier (created_at)-only partial index,
+  superseded by the one above
+
+Usage:
+    python migrations/004_add_pending_partial_index.py
+"""
+
+import sys
+import os
+import logging
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import get_engine
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """Run the migration to add the pending partial index"""
+    try:
+        engine = get_engine()
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            logger.info("Starting migration: Add partial index on pending (created_at, id)")
+
+            logger.info("Creating 'idx_packages_pending_created_id' index...")
+            conn.execute(text("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_packages_pending_created_id
+                ON packages (created_at, id) WHERE status = 'pending'
+            """))
+            logger.info("✓ Index 'idx_packages_pending_created_id' is in place")
+
+            # Dropped only after its replacement exists, so the queue is never unindexed
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_packages_pending_created"))
+            logger.info("✓ Removed superseded 'idx_packages_pending_created' index")
+
+            logger.info("Migration completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"Migration failed: {e}", exc_info=True)
+        return False
+
+
+def rollback_migration():
+    """Rollback the migration (restore the previous pending index)"""
+    try:
+        engine = get_engine()
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            logger.info("Starting rollback: Restore partial index on pending (created_at)")
+
+            conn.execute(text("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_packages_pending_created
+                ON packages (created_at) WHERE status = 'pending'
+            """))
+            logger.info("✓ Restored 'idx_packages_pending_created' index")
+
+            conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_packages_pending_created_id"))
+            logger.info("✓ Removed 'idx_packages_pending_created_id' index")
+
+            logger.info("Rollback completed successfully!")
+            return True
+
+    except Exception as e:
+        logger.error(f"Rollback failed: {e}", exc_info=True)
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database migration for the pending-queue partial index')
+    parser.add_argument('--rollback', action='store_true', help='Rollback the migration')
+    args = parser.parse_args()
+
+    # Validate config
+    try:
+        Config.validate()
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        sys.exit(1)
+
+    if args.rollback:
+        success = rollback_migration()
+    else:
+        success = run_migration()
+
+    sys.exit(0 if success else 1)
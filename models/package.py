@@ -3,7 +3,7 @@ Package model
 """
 
 from enum import Enum
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -14,6 +14,7 @@ class PackageStatus(str, Enum):
     """Package scan status enum"""
     # Working states
     PENDING = "pending"                    # Waiting for scan job to start
+    DISPATCHED = "dispatched"              # Scan job created, waiting for it to run
     DOWNLOADED = "downloaded"              # Downloaded from external PyPI
 
     # Final success states
@@ -43,22 +44,38 @@ class Package(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Unique constraint: same package+version combination can only exist once
+    # (existing databases: see migrations/002_add_package_version_unique.py)
+    # idx_packages_created_at_id backs keyset pagination of the package list
+    # (existing databases: see migrations/003_add_created_at_index.py)
+    # idx_packages_pending_created_id serves the scheduler's pending-queue claim
+    # (existing databases: see migrations/004_add_pending_partial_index.py)
     __table_args__ = (
+        UniqueConstraint('package_name', 'version', name='uq_packages_name_version'),
+        Index('idx_packages_created_at_id', 'created_at', 'id'),
+        Index(
+            'idx_packages_pending_created_id', 'created_at', 'id',
+            postgresql_where=text("status = 'pending'")
+        ),
         {'sqlite_autoincrement': True}  # For SQLite compatibility
     )
 
     def to_dict(self):
         """Convert to dictionary"""
+        return self.row_to_dict(self)
+
+    @staticmethod
+    def row_to_dict(row):
+        """Convert a Package or a plain packages-table result row to a dictionary"""
         return {
-            'id': self.id,
-            'package_name': self.package_name,
-            'version': self.version,
-            'python_version': self.python_version,
-            'status': self.status,
-            'vulnerability_info': self.vulnerability_info,
-            'error_message': self.error_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'id': row.id,
+            'package_name': row.package_name,
+            'version': row.version,
+            'python_version': row.python_version,
+            'status': row.status,
+            'vulnerability_info': row.vulnerability_info,
+            'error_message': row.error_message,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
         }
 
     def __repr__(self):
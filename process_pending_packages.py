@@ -2,15 +2,31 @@
 """
 Process pending packages - create scanner jobs for packages awaiting scanning
 Run every 5 minutes via Hyperplane scheduled pipeline
+
+The pending-package query is served by the partial index
+idx_packages_pending_created_id (migrations/004_add_pending_partial_index.py)
 """
 
 import os
+import re
 import json
+import time
+import hashlib
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Configuration
 MAX_CONCURRENT_JOBS = 10
 JOB_NAME_PREFIX = "package"
@@ -24,16 +40,89 @@ HYPERPLANE_USER_ID = os.getenv("HYPERPLANE_USER_ID", "3630abbd-289b-4d78-85d0-fc
 HYPERPLANE_USER_EMAIL = os.getenv("HYPERPLANE_USER_EMAIL", "shakudo-admin@shakudo.io")
 HYPERPLANE_VC_SERVER_ID = os.getenv("HYPERPLANE_VC_SERVER_ID", "c4be4cb1-9623-4d00-abcb-b472e9a4f192")
 
+# Internal PyPI credentials passed through to scanner pods
+PYPI_SERVER_URL = os.getenv("PYPI_SERVER_URL", "http://pypiserver-pypiserver.hyperplane-pypiserver.svc.cluster.local:8080")
+PYPI_USERNAME = os.getenv("PYPI_USERNAME", "username")
+PYPI_PASSWORD = os.getenv("PYPI_PASSWORD", "password")
+
+# Job submission: "batch" sends one aliased mutation for all packages,
+# "concurrent" sends one mutation per package from a bounded thread pool
+# (for API servers that reject batched documents)
+JOB_SUBMIT_MODE = os.getenv("JOB_SUBMIT_MODE", "batch")
+JOB_SUBMIT_RATE = float(os.getenv("JOB_SUBMIT_RATE", "20"))  # Max submissions per second in concurrent mode
+
+# Backpressure: attempts (with exponential backoff, capped at 30s) while the
+# GraphQL server answers 429/503 or reports a full queue
+GRAPHQL_MAX_ATTEMPTS = 5
+GRAPHQL_MAX_BACKOFF = 30  # seconds
+COUNT_JOBS_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+# Automatic persisted queries: send only the sha256 of the GraphQL document
+# and fall back to the full text when the server hasn't cached it yet.
+# Off by default; only useful when the API server supports APQ.
+GRAPHQL_PERSISTED_QUERIES = os.getenv("GRAPHQL_PERSISTED_QUERIES", "false").lower() == "true"
+
+# Where the running-job count comes from: "graphql" (default) asks Hyperplane
+# via countJobs, "database" counts in-flight rows in the packages table
+# (relies on reclaim_stale_packages() to free rows whose job died)
+RUNNING_JOBS_SOURCE = os.getenv("RUNNING_JOBS_SOURCE", "graphql")
+JOB_TIMEOUT = 3600  # seconds; rows in flight for longer than this are reclaimed
+
+# Set on rows reclaimed from a job that died without reporting; a row that
+# is reclaimed again while still carrying it is marked 'error' instead
+STALE_CLAIM_MESSAGE = "Scan job did not report a result within JOB_TIMEOUT; re-queued"
+
 
-print(f"GraphQL API URL: {HYPERPLANE_GRAPHQL_URL}")
-print(f"Database URL: {DATABASE_URL.split('@')[0].split(':')[0]}:***@{DATABASE_URL.split('@')[1]}")
-print()
+def json_dumps_bytes(obj):
+    """Serialize to JSON bytes, using orjson when available"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def json_loads(data):
+    """Parse JSON bytes or str, using orjson when available"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+logger = logging.getLogger(__name__)
+
+# Static GraphQL request parts, built once and shared by every request.
+# Running without authentication (in-cluster access).
+GRAPHQL_HEADERS = {
+    "Content-Type": "application/json"
+}
+
+
+def create_http_session():
+    """
+    Build the HTTP session shared by all GraphQL calls in a run
+
+    Keeps connections to the API server alive between requests. Only
+    connection failures are retried here: POSTs are not idempotent, and
+    503 backpressure is handled by post_graphql().
+    """
+    session = requests.Session()
+    session.headers.update(GRAPHQL_HEADERS)
+    adapter = HTTPAdapter(
+        pool_maxsize=MAX_CONCURRENT_JOBS,
+        max_retries=Retry(total=3, backoff_factor=0.5)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+http_session = create_http_session()
+
+COUNT_JOBS_QUERY = """
+query countJobs($whereClause: PipelineJobWhereInput!) {
+    countJobs(whereOveride: $whereClause)
+}
+"""
 
-print("=" * 60)
-print("Package Scanner Job Manager")
-print("=" * 60)
-print(f"Started at: {datetime.utcnow().isoformat()}")
-print()
 
 def count_jobs_advanced(
     prefix=None,
@@ -88,414 +177,913 @@ def count_jobs_advanced(
             "schedule": {"equals": "immediate"}
         })
 
-    query = """
-    query countJobs($whereClause: PipelineJobWhereInput!) {
-        countJobs(whereOveride: $whereClause)
-    }
-    """
-
     variables = {
         "whereClause": where_conditions
     }
 
-    response = requests.post(
-        HYPERPLANE_GRAPHQL_URL,
-        json={
-            "operationName": "countJobs",
-            "query": query,
-            "variables": variables
-        }
-    )
+    payload = {
+        "operationName": "countJobs",
+        "query": COUNT_JOBS_QUERY,
+        "variables": variables
+    }
 
-    if response.status_code == 200:
-        try:
-            result = response.json()
-            if "errors" in result:
-                print("GraphQL Errors:")
-                print(json.dumps(result["errors"], indent=2))
-                return None
-
-            count = result.get("data", {}).get("countJobs")
-            return count
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
-    else:
-        print(f"Error: {response.status_code}")
+    try:
+        response, result = post_graphql(payload, timeout=COUNT_JOBS_TIMEOUT)
+    except requests.RequestException as e:
+        logger.error(f"Error: countJobs request failed: {e}")
+        return None
+
+    if result is None:
+        logger.error(f"Error: {response.status_code}")
+        return None
+
+    if "errors" in result:
+        logger.error(f"GraphQL Errors:\n{json.dumps(result['errors'], indent=2)}")
         return None
 
+    return (result.get("data") or {}).get("countJobs")
+
+
+# Module-level connection pool, shared by every query in the run
+DB_POOL_MIN_CONN = 1
+DB_POOL_MAX_CONN = 2
+_db_pool = None
+
+
+def get_db_pool():
+    """
+    Return the database connection pool, creating it on first use
+
+    Creation is retried because the Istio sidecar may still be initializing
+    when the pipeline starts. The delay starts short and doubles up to 2s,
+    so a sidecar that is almost ready costs milliseconds rather than a
+    fixed 2s wait.
+    """
+    global _db_pool
+    if _db_pool is not None:
+        return _db_pool
 
-def get_pending_packages(limit):
-    """Fetch pending packages from database"""
+    logger.info(f"Waiting for Istio sidecar to initialize...")
+    max_retries = 7
+    retry_delay = 0.1  # seconds, doubled after each failure
+    max_retry_delay = 2
+
+    for attempt in range(max_retries):
+        try:
+            _db_pool = ThreadedConnectionPool(
+                DB_POOL_MIN_CONN, DB_POOL_MAX_CONN, DATABASE_URL, connect_timeout=10
+            )
+            logger.info(f"Successfully connected to database")
+            return _db_pool
+        except psycopg2.OperationalError:
+            if attempt < max_retries - 1:
+                logger.warning(f"Connection attempt {attempt + 1} failed, retrying in {retry_delay}s...")
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, max_retry_delay)
+            else:
+                raise
+
+
+def close_db_pool():
+    """Close all pooled database connections"""
+    global _db_pool
+    if _db_pool is not None:
+        _db_pool.closeall()
+        _db_pool = None
+
+
+def claim_pending_packages(limit):
+    """
+    Atomically claim the oldest pending packages for this run
+
+    Claimed rows are moved to 'dispatched' in the same statement that selects
+    them, and FOR UPDATE SKIP LOCKED lets overlapping runs claim disjoint
+    rows, so a package is never dispatched twice. The claim is committed
+    before any GraphQL call so no row locks are held during job creation.
+
+    Dispatched packages leave the 'pending' state, so every run reads from
+    the head of the (created_at, id) partial index and never has to skip
+    over rows it has already seen.
+
+    Returns:
+        list: (id, package_name, version, python_version) row tuples
+    """
     try:
-        print(f"Step 2: Fetching pending packages from database...")
-
-        # Add connection timeout and retry for Istio sidecar initialization
-        print(f"Waiting for Istio sidecar to initialize...")
-        import time
-        max_retries = 3
-        retry_delay = 2  # seconds
-
-        conn = None
-        for attempt in range(max_retries):
-            try:
-                conn = psycopg2.connect(DATABASE_URL, connect_timeout=10)
-                print(f"Successfully connected to database")
-                break
-            except psycopg2.OperationalError as e:
-                if attempt < max_retries - 1:
-                    print(f"Connection attempt {attempt + 1} failed, retrying in {retry_delay}s...")
-                    time.sleep(retry_delay)
-                else:
-                    raise
-
-        if not conn:
-            raise Exception("Failed to connect to database after retries")
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("""
-            SELECT package_name, version, python_version
-            FROM packages
-            WHERE status = 'pending'
-            ORDER BY created_at ASC
-            LIMIT %s;
-        """, (limit,))
-
-        packages = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        print(f"Found {len(packages)} pending package(s) to process")
-        print()
+        logger.info(f"Step 2: Claiming pending packages from database...")
+
+        pool = get_db_pool()
+        conn = pool.getconn()
+        try:
+            # Plain tuple cursor: rows are (id, package_name, version, python_version)
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE packages
+                    SET status = 'dispatched',
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN (
+                        SELECT id
+                        FROM packages
+                        WHERE status = 'pending'
+                        ORDER BY created_at ASC, id ASC
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, package_name, version, python_version;
+                """, (limit,))
+
+                packages = cursor.fetchall()
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+
+        logger.info(f"Claimed {len(packages)} pending package(s) to process")
 
         return packages
 
     except Exception as e:
-        print(f"Error fetching packages from database: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error claiming packages from database: {str(e)}")
         return []
 
 
+def release_packages(package_ids):
+    """
+    Return claimed packages whose job could not be created to 'pending'
 
+    Uses a single UPDATE with an array parameter so the whole batch costs
+    one round-trip. Released packages are picked up again by the next run.
 
-def create_scanner_job_graphql(package):
+    Returns:
+        int: Number of rows updated
     """
-    Create a scanner job using Hyperplane GraphQL API
-    This makes jobs appear in Hyperplane UI
+    if not package_ids:
+        return 0
 
-    Args:
-        package: Dict with keys: package_name, version, python_version
+    try:
+        pool = get_db_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE packages
+                    SET status = 'pending',
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ANY(%s) AND status = 'dispatched';
+                """, (list(package_ids),))
+                updated = cursor.rowcount
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+
+        logger.info(f"Released {updated} package(s) back to pending")
+        return updated
+
+    except Exception as e:
+        logger.exception(f"Error releasing packages: {str(e)}")
+        return 0
+
+
+def reclaim_stale_packages():
+    """
+    Re-queue packages whose scan job died without reporting a result
+
+    A row stays 'dispatched'/'downloaded' until the scanner writes a final
+    status; if the job is OOM-killed, evicted or never starts, nothing else
+    ever moves it. Rows not touched within JOB_TIMEOUT go back to 'pending'
+    once; if the retry dies the same way (the marker message is still set)
+    they are marked 'error' so a poison package can't loop forever.
+
+    Returns:
+        int: Number of rows reclaimed
     """
     try:
-        # Extract package info
-        package_name = package['package_name']
-        version = package.get('version') or 'latest'
-        python_version = package.get('python_version') or '3.11'  # Default to 3.11
-
-        # Construct full package spec: packagename==version
-        package_spec = f"{package_name}=={version}" if version != 'latest' else package_name
-
-        print(f"Creating job via GraphQL for package: {package_spec} (Python {python_version})")
-
-        # Generate unique job name
-        timestamp = int(datetime.utcnow().timestamp())
-        safe_name = package_name.lower().replace('_', '-').replace('.', '-')
-        safe_version = version.replace('.', '-')
-        job_name = f"pythonPakcageScanner-{safe_name}-{safe_version}-py{python_version.replace('.', '')}-{timestamp}"
-
-        # Build pod spec matching working configuration
-        pod_spec = {
-            "priorityClassName": "shakudo-job-default",
-            "restartPolicy": "Never",
-            "serviceAccountName": "gcr-pipelines",
-            "nodeSelector": {
-                "hyperplane.dev/nodeType": "hyperplane-system-pool"
-            },
-            "tolerations": [{
-                "effect": "NoSchedule",
-                "key": "purpose",
-                "operator": "Equal",
-                "value": "pipelines"
-            }],
-            "volumes": [
+        pool = get_db_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE packages
+                    SET status = CASE WHEN error_message = %(message)s THEN 'error' ELSE 'pending' END,
+                        error_message = %(message)s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE status IN ('dispatched', 'downloaded')
+                      AND updated_at < now() - make_interval(secs => %(timeout)s)
+                    RETURNING status;
+                """, {"message": STALE_CLAIM_MESSAGE, "timeout": JOB_TIMEOUT})
+                statuses = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+
+        if statuses:
+            failed = statuses.count('error')
+            logger.warning(
+                f"Reclaimed {len(statuses)} stale package(s): "
+                f"{len(statuses) - failed} re-queued, {failed} marked error"
+            )
+        return len(statuses)
+
+    except Exception as e:
+        logger.exception(f"Error reclaiming stale packages: {str(e)}")
+        return 0
+
+
+def count_in_flight_packages():
+    """
+    Count scan jobs in flight using the packages table
+
+    A package is in flight from the moment its job is created ('dispatched')
+    until the scanner reports a final status. Rows not touched within
+    JOB_TIMEOUT are ignored so a job that died silently can't hold a slot
+    forever.
+
+    Returns:
+        int: Number of in-flight packages, or None on error
+    """
+    try:
+        pool = get_db_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT count(*)
+                    FROM packages
+                    WHERE status IN %s
+                      AND updated_at > CURRENT_TIMESTAMP - make_interval(secs => %s);
+                """, (('dispatched', 'downloaded'), JOB_TIMEOUT))
+                count = cursor.fetchone()[0]
+            conn.rollback()
+        finally:
+            pool.putconn(conn)
+
+        return count
+
+    except Exception as e:
+        logger.exception(f"Error counting in-flight packages: {str(e)}")
+        return None
+
+
+# createPipelineJobWithAlerting mutation, split into variable definitions and the
+# root field so several jobs can be aliased into a single request. Only the
+# per-job variables ($jobName, $podSpec) differ between jobs in a batch; the
+# remaining variables are declared once and shared.
+PER_JOB_VARIABLE_DEFINITIONS = "$jobName: String!, $podSpec: String"
+SHARED_JOB_VARIABLE_DEFINITIONS = "$type: String!, $imageHash: String, $noHyperplaneCommands: Boolean, $debuggable: Boolean!, $notificationsEnabled: Boolean, $notificationTargetIds: [String!], $timeout: Int!, $activeTimeout: Int, $maxRetries: Int!, $schedule: String, $timezone: String, $yamlPath: String!, $workingDir: String!, $noGitInit: Boolean, $runParallel: Boolean, $hyperplaneVCServerId: HyperplaneVCServerWhereUniqueInput, $billingProjectId: BillingProjectWhereUniqueInput, $hyperplaneSecrets: [HyperplaneSecretWhereUniqueInput!], $branchName: String, $commitId: String, $parameters: ParameterCreateNestedManyWithoutPipelineJobInput, $hyperplaneUserId: String!, $hyperplaneUserEmail: String!, $group: String, $hyperplaneServiceAccountId: HyperplaneServiceAccountWhereUniqueInput, $cloudSqlProxyEnabled: Boolean, $hyperplaneCloudSqlProxyId: String, $pipelineType: String"
+CREATE_JOB_FIELD = """createPipelineJobWithAlerting(
+            input: {jobName: $jobName, jobType: $type, imageHash: $imageHash, noHyperplaneCommands: $noHyperplaneCommands, debuggable: $debuggable, notificationsEnabled: $notificationsEnabled, runParallel: $runParallel, notificationTargetIds: $notificationTargetIds, timeout: $timeout, activeTimeout: $activeTimeout, maxRetries: $maxRetries, schedule: $schedule, pipelineYamlPath: $yamlPath, workingDir: $workingDir, noGitInit: $noGitInit, hyperplaneVCServer: {connect: $hyperplaneVCServerId}, billingProject: {connect: $billingProjectId}, hyperplaneSecrets: {connect: $hyperplaneSecrets}, branchName: $branchName, commitId: $commitId, parameters: $parameters, timezone: $timezone, hyperplaneUser: {connect: {id: $hyperplaneUserId}}, hyperplaneUserEmail: $hyperplaneUserEmail, group: $group, podSpec: $podSpec, hyperplaneServiceAccount: {connect: $hyperplaneServiceAccountId}, cloudSqlProxyEnabled: $cloudSqlProxyEnabled, hyperplaneCloudSqlProxyId: $hyperplaneCloudSqlProxyId, pipelineType: $pipelineType}
+          ) {
+            id
+            jobName
+            status
+            statusReason
+          }"""
+# Single-job document, used by concurrent submission mode
+CREATE_JOB_MUTATION = (
+    f"mutation createPipelineJobWithAlerting({PER_JOB_VARIABLE_DEFINITIONS}, {SHARED_JOB_VARIABLE_DEFINITIONS}) {{\n"
+    f"{CREATE_JOB_FIELD}\n"
+    "}"
+)
+PER_JOB_VARIABLE_PATTERN = re.compile(r'\$(jobName|podSpec)\b')
+
+
+# Pod spec matching working configuration. Only the PACKAGE_NAME and
+# PYTHON_VERSION env values differ between jobs, so the spec is serialized once
+# at import and the sentinels are substituted per package.
+PACKAGE_SPEC_SENTINEL = "__PACKAGE_SPEC_SENTINEL__"
+PYTHON_VERSION_SENTINEL = "__PYTHON_VERSION_SENTINEL__"
+
+POD_SPEC_TEMPLATE = {
+    "priorityClassName": "shakudo-job-default",
+    "restartPolicy": "Never",
+    "serviceAccountName": "gcr-pipelines",
+    "nodeSelector": {
+        "hyperplane.dev/nodeType": "hyperplane-system-pool"
+    },
+    "tolerations": [{
+        "effect": "NoSchedule",
+        "key": "purpose",
+        "operator": "Equal",
+        "value": "pipelines"
+    }],
+    "volumes": [
+        {
+            "name": "gke-service-account-json",
+            "secret": {
+                "secretName": "service-account-key-pipelines-dccri9ba"
+            }
+        },
+        {
+            "name": "gitrepo",
+            "emptyDir": {}
+        },
+        {
+            "name": "github-key",
+            "secret": {
+                "secretName": "python-package-scanner-deploy-key",
+                "defaultMode": 400
+            }
+        }
+    ],
+    "securityContext": {
+        "fsGroup": 65533
+    },
+    "initContainers": [
+        {
+            "name": "node-ip-monitor",
+            "image": "gcr.io/devsentient-infra/dev/add-pod-label-container:edbe221f844dc6d7e47ed6a7c8163c71192ef838",
+            "command": ["/bin/bash"],
+            "args": ["-c", "python3 /usr/local/bin/add_node_ip_label.py"],
+            "env": [
                 {
-                    "name": "gke-service-account-json",
-                    "secret": {
-                        "secretName": "service-account-key-pipelines-dccri9ba"
-                    }
+                    "name": "NODE_IP",
+                    "valueFrom": {"fieldRef": {"fieldPath": "status.hostIP"}}
                 },
                 {
-                    "name": "gitrepo",
-                    "emptyDir": {}
+                    "name": "NODE_NAME",
+                    "valueFrom": {"fieldRef": {"fieldPath": "spec.nodeName"}}
                 },
                 {
-                    "name": "github-key",
-                    "secret": {
-                        "secretName": "python-package-scanner-deploy-key",
-                        "defaultMode": 400
-                    }
-                }
-            ],
-            "securityContext": {
-                "fsGroup": 65533
-            },
-            "initContainers": [
-                {
-                    "name": "node-ip-monitor",
-                    "image": "gcr.io/devsentient-infra/dev/add-pod-label-container:edbe221f844dc6d7e47ed6a7c8163c71192ef838",
-                    "command": ["/bin/bash"],
-                    "args": ["-c", "python3 /usr/local/bin/add_node_ip_label.py"],
-                    "env": [
-                        {
-                            "name": "NODE_IP",
-                            "valueFrom": {"fieldRef": {"fieldPath": "status.hostIP"}}
-                        },
-                        {
-                            "name": "NODE_NAME",
-                            "valueFrom": {"fieldRef": {"fieldPath": "spec.nodeName"}}
-                        },
-                        {
-                            "name": "POD_NAME",
-                            "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}
-                        },
-                        {
-                            "name": "POD_NAMESPACE",
-                            "valueFrom": {"fieldRef": {"fieldPath": "metadata.namespace"}}
-                        },
-                        {
-                            "name": "HYPERPLANE__DEFAULT_NAMESPACE",
-                            "value": "hyperplane-core"
-                        }
-                    ]
+                    "name": "POD_NAME",
+                    "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}
                 },
                 {
-                    "name": "git-sync-init",
-                    "image": SCANNER_IMAGE,
-                    "command": ["/bin/sh"],
-                    "args": [
-                        "-c",
-                        f"mkdir -p /root/.ssh && cp /etc/git-secret/* /root/.ssh/ && chmod 400 /root/.ssh/id_rsa && "
-                        f"((GIT_SSH_COMMAND=\"ssh -o StrictHostKeyChecking=no\" git clone --depth 1 "
-                        f"git@git-server-python-package-scanner.hyperplane-pipelines.svc.cluster.local:/tmp/git/monorepo /tmp/git/monorepo) || "
-                        f"(GIT_SSH_COMMAND=\"ssh -o StrictHostKeyChecking=no\" git clone --depth 1 --branch main "
-                        f"git@github.com:usama-shakudo/python-libary-scanner.git /tmp/git/monorepo)) && "
-                        f"echo \"Running from commit: $(cd /tmp/git/monorepo && git rev-parse HEAD 2>/dev/null || echo 'could not print commit id')\""
-                    ],
-                    "volumeMounts": [
-                        {"name": "gitrepo", "mountPath": "/tmp/git"},
-                        {"name": "github-key", "mountPath": "/etc/git-secret", "readOnly": True}
-                    ],
-                    "resources": {
-                        "limits": {"cpu": "200m", "memory": "512Mi"}
-                    }
-                }
-            ],
-            "containers": [
-                {
-                    "name": "d2v-pipeline",
-                    "image": SCANNER_IMAGE,
-                    "workingDir": "/tmp/git/monorepo/",
-                    "command": ["/bin/sh"],
-                    "args": [
-                        "-c",
-                        "env > /etc/environment && "
-                        "echo $SERVICE_ACCOUNT_KEY_CONTENT > /etc/service_account_key_content && "
-                        "chmod +x /tmp/git/monorepo/scan_package.py && "
-                        "/tmp/git/monorepo/scan_package.py"
-                    ],
-                    "env": [
-                        {"name": "PACKAGE_NAME", "value": package_spec},
-                        {"name": "PYTHON_VERSION", "value": python_version},
-                        {"name": "DATABASE_URL", "value": DATABASE_URL},
-                        {"name": "PYPI_SERVER_URL", "value": os.getenv("PYPI_SERVER_URL", "http://pypiserver-pypiserver.hyperplane-pypiserver.svc.cluster.local:8080")},
-                        {"name": "PYPI_USERNAME", "value": os.getenv("PYPI_USERNAME", "username")},
-                        {"name": "PYPI_PASSWORD", "value": os.getenv("PYPI_PASSWORD", "password")},
-                        {"name": "MY_POD_NAME", "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}},
-                        {"name": "MY_POD_NAMESPACE", "valueFrom": {"fieldRef": {"fieldPath": "metadata.namespace"}}},
-                        {"name": "MY_NODE_IP", "valueFrom": {"fieldRef": {"fieldPath": "status.podIP"}}},
-                        {"name": "HYPERPLANE_JOB_CHECKED_COMMIT_ID", "value": ""},
-                        {"name": "HYPERPLANE_JOB_CHECKED_BRANCH_NAME", "value": "main"},
-                        {"name": "HYPERPLANE_JOB_DEBUGGABLE", "value": "false"},
-                        {"name": "PIPELINES_USER", "value": "usama"},
-                        {"name": "USER_EMAIL", "value": "usama@shakudo.io"},
-                        {"name": "HYPERPLANE_JOB_PIPELINE_YAML_PATH", "value": "scan_package.py"}
-                    ],
-                    "volumeMounts": [
-                        {"name": "gitrepo", "mountPath": "/tmp/git"},
-                        {"name": "gke-service-account-json", "mountPath": "/etc/gke-service-account-json", "readOnly": True}
-                    ],
-                    "resources": {
-                        "limits": {"cpu": "500m", "memory": "2Gi"},
-                        "requests": {"cpu": "500m", "memory": "2Gi"}
-                    }
+                    "name": "POD_NAMESPACE",
+                    "valueFrom": {"fieldRef": {"fieldPath": "metadata.namespace"}}
                 },
                 {
-                    "name": "sidecar-terminator",
-                    "image": "gcr.io/devsentient-infra/dev/sidecar-terminator:0f74575067e596d757590ee7e5a7536eb5ab53e7",
-                    "ports": [{"name": "http", "containerPort": 9092, "protocol": "TCP"}],
-                    "env": [
-                        {"name": "MY_POD_NAME", "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}},
-                        {"name": "MY_POD_NAMESPACE", "valueFrom": {"fieldRef": {"fieldPath": "metadata.namespace"}}}
-                    ],
-                    "resources": {"requests": {"cpu": "64m"}}
+                    "name": "HYPERPLANE__DEFAULT_NAMESPACE",
+                    "value": "hyperplane-core"
                 }
             ]
+        },
+        {
+            "name": "git-sync-init",
+            "image": SCANNER_IMAGE,
+            "command": ["/bin/sh"],
+            "args": [
+                "-c",
+                f"mkdir -p /root/.ssh && cp /etc/git-secret/* /root/.ssh/ && chmod 400 /root/.ssh/id_rsa && "
+                f"((GIT_SSH_COMMAND=\"ssh -o StrictHostKeyChecking=no\" git clone --depth 1 "
+                f"git@git-server-python-package-scanner.hyperplane-pipelines.svc.cluster.local:/tmp/git/monorepo /tmp/git/monorepo) || "
+                f"(GIT_SSH_COMMAND=\"ssh -o StrictHostKeyChecking=no\" git clone --depth 1 --branch main "
+                f"git@github.com:usama-shakudo/python-libary-scanner.git /tmp/git/monorepo)) && "
+                f"echo \"Running from commit: $(cd /tmp/git/monorepo && git rev-parse HEAD 2>/dev/null || echo 'could not print commit id')\""
+            ],
+            "volumeMounts": [
+                {"name": "gitrepo", "mountPath": "/tmp/git"},
+                {"name": "github-key", "mountPath": "/etc/git-secret", "readOnly": True}
+            ],
+            "resources": {
+                "limits": {"cpu": "200m", "memory": "512Mi"}
+            }
         }
-
-        # GraphQL mutation
-        mutation = """
-        mutation createPipelineJobWithAlerting($jobName: String!, $type: String!, $imageHash: String, $noHyperplaneCommands: Boolean, $debuggable: Boolean!, $notificationsEnabled: Boolean, $notificationTargetIds: [String!], $timeout: Int!, $activeTimeout: Int, $maxRetries: Int!, $schedule: String, $timezone: String, $yamlPath: String!, $workingDir: String!, $noGitInit: Boolean, $runParallel: Boolean, $hyperplaneVCServerId: HyperplaneVCServerWhereUniqueInput, $billingProjectId: BillingProjectWhereUniqueInput, $hyperplaneSecrets: [HyperplaneSecretWhereUniqueInput!], $branchName: String, $commitId: String, $parameters: ParameterCreateNestedManyWithoutPipelineJobInput, $hyperplaneUserId: String!, $hyperplaneUserEmail: String!, $group: String, $podSpec: String, $hyperplaneServiceAccountId: HyperplaneServiceAccountWhereUniqueInput, $cloudSqlProxyEnabled: Boolean, $hyperplaneCloudSqlProxyId: String, $pipelineType: String) {
-          createPipelineJobWithAlerting(
-            input: {jobName: $jobName, jobType: $type, imageHash: $imageHash, noHyperplaneCommands: $noHyperplaneCommands, debuggable: $debuggable, notificationsEnabled: $notificationsEnabled, runParallel: $runParallel, notificationTargetIds: $notificationTargetIds, timeout: $timeout, activeTimeout: $activeTimeout, maxRetries: $maxRetries, schedule: $schedule, pipelineYamlPath: $yamlPath, workingDir: $workingDir, noGitInit: $noGitInit, hyperplaneVCServer: {connect: $hyperplaneVCServerId}, billingProject: {connect: $billingProjectId}, hyperplaneSecrets: {connect: $hyperplaneSecrets}, branchName: $branchName, commitId: $commitId, parameters: $parameters, timezone: $timezone, hyperplaneUser: {connect: {id: $hyperplaneUserId}}, hyperplaneUserEmail: $hyperplaneUserEmail, group: $group, podSpec: $podSpec, hyperplaneServiceAccount: {connect: $hyperplaneServiceAccountId}, cloudSqlProxyEnabled: $cloudSqlProxyEnabled, hyperplaneCloudSqlProxyId: $hyperplaneCloudSqlProxyId, pipelineType: $pipelineType}
-          ) {
-            id
-            jobName
-            status
-            statusReason
-          }
-        }
-        """
-
-        variables = {
-            "jobName": job_name,
-            "type": "python_base_image",
-            "imageHash": "",
-            "noHyperplaneCommands": False,  # Must be False for proper execution
-            "debuggable": False,
-            "notificationsEnabled": False,
-            "notificationTargetIds": [],
-            "timeout": 3600,  # 1 hour timeout
-            "activeTimeout": 3600,
-            "maxRetries": 2,
-            "schedule": "immediate",  # Important: Mark as immediate job
-            "yamlPath": "scan_package.py",  # Just for reference
+    ],
+    "containers": [
+        {
+            "name": "d2v-pipeline",
+            "image": SCANNER_IMAGE,
             "workingDir": "/tmp/git/monorepo/",
-            "noGitInit": True,  # Important: We don't need git
-            "hyperplaneVCServerId": {
-                "id": HYPERPLANE_VC_SERVER_ID
-            },
-            "branchName": "main",
-            "commitId": "",
-            "parameters": {
-                "create": []
-            },
-            "hyperplaneUserId": HYPERPLANE_USER_ID,
-            "hyperplaneUserEmail": HYPERPLANE_USER_EMAIL,
-            "group": "",
-            "podSpec": json.dumps(pod_spec),  # Pod spec as JSON string
-            "hyperplaneSecrets": [],
-            "cloudSqlProxyEnabled": False,
-            "pipelineType": "BASH"
+            "command": ["/bin/sh"],
+            "args": [
+                "-c",
+                "env > /etc/environment && "
+                "echo $SERVICE_ACCOUNT_KEY_CONTENT > /etc/service_account_key_content && "
+                "chmod +x /tmp/git/monorepo/scan_package.py && "
+                "/tmp/git/monorepo/scan_package.py"
+            ],
+            "env": [
+                {"name": "PACKAGE_NAME", "value": PACKAGE_SPEC_SENTINEL},
+                {"name": "PYTHON_VERSION", "value": PYTHON_VERSION_SENTINEL},
+                {"name": "DATABASE_URL", "value": DATABASE_URL},
+                {"name": "PYPI_SERVER_URL", "value": PYPI_SERVER_URL},
+                {"name": "PYPI_USERNAME", "value": PYPI_USERNAME},
+                {"name": "PYPI_PASSWORD", "value": PYPI_PASSWORD},
+                {"name": "MY_POD_NAME", "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}},
+                {"name": "MY_POD_NAMESPACE", "valueFrom": {"fieldRef": {"fieldPath": "metadata.namespace"}}},
+                {"name": "MY_NODE_IP", "valueFrom": {"fieldRef": {"fieldPath": "status.podIP"}}},
+                {"name": "HYPERPLANE_JOB_CHECKED_COMMIT_ID", "value": ""},
+                {"name": "HYPERPLANE_JOB_CHECKED_BRANCH_NAME", "value": "main"},
+                {"name": "HYPERPLANE_JOB_DEBUGGABLE", "value": "false"},
+                {"name": "PIPELINES_USER", "value": "usama"},
+                {"name": "USER_EMAIL", "value": "usama@shakudo.io"},
+                {"name": "HYPERPLANE_JOB_PIPELINE_YAML_PATH", "value": "scan_package.py"}
+            ],
+            "volumeMounts": [
+                {"name": "gitrepo", "mountPath": "/tmp/git"},
+                {"name": "gke-service-account-json", "mountPath": "/etc/gke-service-account-json", "readOnly": True}
+            ],
+            "resources": {
+                "limits": {"cpu": "500m", "memory": "2Gi"},
+                "requests": {"cpu": "500m", "memory": "2Gi"}
+            }
+        },
+        {
+            "name": "sidecar-terminator",
+            "image": "gcr.io/devsentient-infra/dev/sidecar-terminator:0f74575067e596d757590ee7e5a7536eb5ab53e7",
+            "ports": [{"name": "http", "containerPort": 9092, "protocol": "TCP"}],
+            "env": [
+                {"name": "MY_POD_NAME", "valueFrom": {"fieldRef": {"fieldPath": "metadata.name"}}},
+                {"name": "MY_POD_NAMESPACE", "valueFrom": {"fieldRef": {"fieldPath": "metadata.namespace"}}}
+            ],
+            "resources": {"requests": {"cpu": "64m"}}
         }
+    ]
+}
+
+
+def validate_pod_spec_template(pod_spec):
+    """
+    Sanity-check the pod spec template once at import
+
+    Catches typos that the API server would otherwise only report after a
+    job has been submitted (or that would make every scan job fail to
+    schedule).
+
+    Raises:
+        ValueError: If the template is malformed
+    """
+    volumes = {volume["name"] for volume in pod_spec.get("volumes", [])}
+    containers = pod_spec.get("initContainers", []) + pod_spec.get("containers", [])
+
+    for container in containers:
+        name = container.get("name")
+        if not name or not container.get("image"):
+            raise ValueError(f"Pod spec container {name!r} needs a name and an image")
+
+        for mount in container.get("volumeMounts", []):
+            if mount["name"] not in volumes:
+                raise ValueError(f"Container {name!r} mounts undeclared volume {mount['name']!r}")
+
+        for env in container.get("env", []):
+            if not env.get("name") or ("value" in env) == ("valueFrom" in env):
+                raise ValueError(f"Container {name!r} has invalid env entry {env!r}")
+
+    template_json = json_dumps_bytes(pod_spec).decode('utf-8')
+    for sentinel in (PACKAGE_SPEC_SENTINEL, PYTHON_VERSION_SENTINEL):
+        if template_json.count(sentinel) != 1:
+            raise ValueError(f"Pod spec template must contain {sentinel} exactly once")
+
+
+validate_pod_spec_template(POD_SPEC_TEMPLATE)
+POD_SPEC_TEMPLATE_JSON = json_dumps_bytes(POD_SPEC_TEMPLATE).decode('utf-8')
+
+
+def render_pod_spec(package_spec, python_version):
+    """Render the pod spec JSON string for one package from the template"""
+    # json.dumps(...)[1:-1] gives the escaped string body without its quotes
+    return (
+        POD_SPEC_TEMPLATE_JSON
+        .replace(PACKAGE_SPEC_SENTINEL, json.dumps(package_spec)[1:-1])
+        .replace(PYTHON_VERSION_SENTINEL, json.dumps(python_version)[1:-1])
+    )
+
+
+# Variables that are identical for every scanner job
+SHARED_JOB_VARIABLES = {
+    "type": "python_base_image",
+    "imageHash": "",
+    "noHyperplaneCommands": False,  # Must be False for proper execution
+    "debuggable": False,
+    "notificationsEnabled": False,
+    "notificationTargetIds": [],
+    "timeout": JOB_TIMEOUT,  # 1 hour timeout
+    "activeTimeout": JOB_TIMEOUT,
+    "maxRetries": 2,
+    "schedule": "immediate",  # Important: Mark as immediate job
+    "yamlPath": "scan_package.py",  # Just for reference
+    "workingDir": "/tmp/git/monorepo/",
+    "noGitInit": True,  # Important: We don't need git
+    "hyperplaneVCServerId": {
+        "id": HYPERPLANE_VC_SERVER_ID
+    },
+    "branchName": "main",
+    "commitId": "",
+    "parameters": {
+        "create": []
+    },
+    "hyperplaneUserId": HYPERPLANE_USER_ID,
+    "hyperplaneUserEmail": HYPERPLANE_USER_EMAIL,
+    "group": "",
+    "hyperplaneSecrets": [],
+    "cloudSqlProxyEnabled": False,
+    "pipelineType": "BASH"
+}
+
+
+def build_shared_job_variables():
+    """Fresh copy of SHARED_JOB_VARIABLES that callers can extend with per-job values"""
+    return dict(SHARED_JOB_VARIABLES)
+
+
+# Characters that are not allowed in job names, mapped to '-' in one pass
+SAFE_NAME_TABLE = str.maketrans({"_": "-", ".": "-"})
+# Python versions appear in job names without dots (3.11 -> 311)
+STRIP_DOTS_TABLE = str.maketrans({".": None})
+# Exact versions the scanner accepts after "=="; anything else (ranges such
+# as ">=1.20.0", "latest") is dispatched as a bare name and resolved to latest
+EXACT_VERSION_RE = re.compile(r'\A[A-Za-z0-9][A-Za-z0-9.+!_-]*\Z')
+
+
+def build_job_variables(package):
+    """
+    Build the per-job GraphQL variables (job name and pod spec) for a package
+
+    Args:
+        package: Row tuple of (id, package_name, version, python_version)
+
+    Returns:
+        dict: {"jobName": ..., "podSpec": ...}
+    """
+    # Extract package info
+    _, package_name, version, python_version = package
+    version = version or 'latest'
+    python_version = python_version or '3.11'  # Default to 3.11
+
+    # Construct full package spec: packagename==version, or packagename for latest/ranges
+    if version != 'latest' and EXACT_VERSION_RE.match(version):
+        package_spec = f"{package_name}=={version}"
+    else:
+        package_spec = package_name
+
+    # Generate unique job name
+    timestamp = int(time.time())
+    safe_name = package_name.lower().translate(SAFE_NAME_TABLE)
+    safe_version = version.translate(SAFE_NAME_TABLE)
+    safe_python_version = python_version.translate(STRIP_DOTS_TABLE)
+    job_name = f"pythonPakcageScanner-{safe_name}-{safe_version}-py{safe_python_version}-{timestamp}"
+
+    return {
+        "jobName": job_name,
+        "podSpec": render_pod_spec(package_spec, python_version)  # Pod spec as JSON string
+    }
+
+
+def build_batch_mutation(count):
+    """
+    Build a single mutation document that creates `count` jobs
+
+    Each job is an aliased root field (job0, job1, ...) bound to its own
+    $jobNameN / $podSpecN variables; all other variables are shared.
+    """
+    definitions = [SHARED_JOB_VARIABLE_DEFINITIONS]
+    fields = []
+    for i in range(count):
+        definitions.append(f"$jobName{i}: String!, $podSpec{i}: String")
+        field = PER_JOB_VARIABLE_PATTERN.sub(lambda m: f"${m.group(1)}{i}", CREATE_JOB_FIELD)
+        fields.append(f"job{i}: {field}")
+
+    return (
+        f"mutation batchCreatePipelineJobs({', '.join(definitions)}) {{\n"
+        + "\n".join(fields)
+        + "\n}"
+    )
+
+
+def is_server_saturated(result):
+    """
+    True if a GraphQL result reports a full queue and created nothing
+
+    Partially successful batches are not treated as saturated, since
+    retrying them would create duplicate jobs.
+    """
+    errors = result.get("errors") or []
+    if not any("queue full" in str(error.get("message", "")).lower() for error in errors):
+        return False
+    return not any((result.get("data") or {}).values())
+
+
+PERSISTED_QUERY_ERRORS = ("PersistedQueryNotFound", "PersistedQueryNotSupported")
+
+# sha256 of each GraphQL document sent, keyed by document text
+persisted_query_hashes = {}
+
+
+def build_graphql_bodies(payload):
+    """
+    Encode a GraphQL payload for sending
+
+    Returns:
+        tuple: (first_body, full_body). With persisted queries enabled the
+        first body carries only the document hash and full_body adds the
+        document text for a cache miss; otherwise both are the same.
+    """
+    if not GRAPHQL_PERSISTED_QUERIES:
+        body = json_dumps_bytes(payload)
+        return body, body
+
+    query = payload["query"]
+    if query not in persisted_query_hashes:
+        persisted_query_hashes[query] = hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": persisted_query_hashes[query]}}
+    hashed = {key: value for key, value in payload.items() if key != "query"}
+    hashed["extensions"] = extensions
+    return json_dumps_bytes(hashed), json_dumps_bytes({**payload, "extensions": extensions})
+
+
+def is_persisted_query_miss(response, result):
+    """True if the server asked for the full document of a persisted query"""
+    if result is None:
+        # Some servers answer a miss with HTTP 400 and a GraphQL error body
+        if response.status_code != 400:
+            return False
+        try:
+            result = json_loads(response.content)
+        except ValueError:
+            return False
+    return any(
+        str(error.get("message", "")) in PERSISTED_QUERY_ERRORS
+        or (error.get("extensions") or {}).get("code") in ("PERSISTED_QUERY_NOT_FOUND", "PERSISTED_QUERY_NOT_SUPPORTED")
+        for error in result.get("errors") or []
+    )
+
+
+def post_graphql(payload, timeout=30):
+    """
+    POST a GraphQL payload, backing off while the API server is saturated
+
+    HTTP 429/503 responses and "queue full" GraphQL errors are retried after
+    min(GRAPHQL_MAX_BACKOFF, 2**attempt) seconds (or the server's
+    Retry-After, if given), up to GRAPHQL_MAX_ATTEMPTS times. Packages that
+    still fail stay pending for the next run. With GRAPHQL_PERSISTED_QUERIES
+    the document hash is sent first and the full text only on a cache miss.
+
+    Returns:
+        tuple: (response, result) where result is the decoded body for HTTP 200, else None
+    """
+    body, full_body = build_graphql_bodies(payload)
+
+    for attempt in range(GRAPHQL_MAX_ATTEMPTS):
+        response = http_session.post(HYPERPLANE_GRAPHQL_URL, data=body, timeout=timeout)
+        result = json_loads(response.content) if response.status_code == 200 else None
+
+        if body is not full_body and is_persisted_query_miss(response, result):
+            # Cache miss: send the full document once, which also registers it
+            body = full_body
+            response = http_session.post(HYPERPLANE_GRAPHQL_URL, data=body, timeout=timeout)
+            result = json_loads(response.content) if response.status_code == 200 else None
+
+        saturated = response.status_code in (429, 503) or (result is not None and is_server_saturated(result))
+        if not saturated or attempt == GRAPHQL_MAX_ATTEMPTS - 1:
+            return response, result
+
+        retry_after = response.headers.get("Retry-After", "")
+        delay = min(GRAPHQL_MAX_BACKOFF, int(retry_after) if retry_after.isdigit() else 2 ** attempt)
+        logger.warning(f"GraphQL server saturated (attempt {attempt + 1}/{GRAPHQL_MAX_ATTEMPTS}), retrying in {delay}s...")
+        time.sleep(delay)
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls so at most `rate` start per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        """Block until the caller may proceed"""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+submit_rate_limiter = RateLimiter(JOB_SUBMIT_RATE)
+
+
+def job_result(package, job_data=None, error=None):
+    """Compact per-package outcome record collected for the run summary"""
+    package_id, package_name, version, _ = package
+    job_data = job_data or {}
+    return {
+        "id": package_id,
+        "package": package_name,
+        "version": version,
+        "job_id": job_data.get("id"),
+        "status": job_data.get("status"),
+        "status_reason": job_data.get("statusReason"),
+        "error": error
+    }
+
+
+def create_scanner_job_graphql(package):
+    """
+    Create a scanner job using Hyperplane GraphQL API
+    This makes jobs appear in Hyperplane UI
+
+    Args:
+        package: Row tuple of (id, package_name, version, python_version)
+
+    Returns:
+        dict: Outcome record (see job_result); job_id is None on failure
+    """
+    try:
+        variables = build_shared_job_variables()
+        variables.update(build_job_variables(package))
 
         payload = {
             "operationName": "createPipelineJobWithAlerting",
-            "query": mutation,
+            "query": CREATE_JOB_MUTATION,
             "variables": variables
         }
 
-        # Running without authentication (in-cluster access)
-        headers = {
-            "Content-Type": "application/json"
+        submit_rate_limiter.wait()
+        response, result = post_graphql(payload)
+
+        if result is None:
+            return job_result(package, error=f"HTTP {response.status_code}: {response.text}")
+
+        if "errors" in result:
+            return job_result(package, error=str(result["errors"]))
+
+        data = result.get("data") or {}
+        return job_result(package, data.get("createPipelineJobWithAlerting"))
+
+    except Exception as e:
+        logger.exception(f"  ✗ Error creating job for {package[1]}: {str(e)}")
+        return job_result(package, error=str(e))
+
+
+def create_scanner_jobs_batch(packages):
+    """
+    Create scanner jobs for several packages with one GraphQL request
+
+    All createPipelineJobWithAlerting mutations are aliased into a single
+    document (see build_batch_mutation) so dispatch costs one round-trip
+    regardless of how many packages are pending.
+
+    Args:
+        packages: List of (id, package_name, version, python_version) row tuples
+
+    Returns:
+        list: One outcome record per package (see job_result)
+    """
+    if not packages:
+        return []
+
+    try:
+        variables = build_shared_job_variables()
+        for i, package in enumerate(packages):
+            job_variables = build_job_variables(package)
+            variables[f"jobName{i}"] = job_variables["jobName"]
+            variables[f"podSpec{i}"] = job_variables["podSpec"]
+
+        payload = {
+            "operationName": "batchCreatePipelineJobs",
+            "query": build_batch_mutation(len(packages)),
+            "variables": variables
         }
 
-        response = requests.post(HYPERPLANE_GRAPHQL_URL, headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            if "errors" in result:
-                print(f"  ✗ GraphQL errors: {result['errors']}")
-                return False
-
-            job_data = result.get("data", {}).get("createPipelineJobWithAlerting", {})
-            print(f"  ✓ Job created: {job_data.get('id')}")
-            print(f"     Status: {job_data.get('status')}")
-            if job_data.get('statusReason'):
-                print(f"     Status Reason: {job_data.get('statusReason')}")
-            return True
-        else:
-            print(f"  ✗ HTTP {response.status_code}: {response.text}")
-            return False
+        response, result = post_graphql(payload)
+
+        if result is None:
+            error = f"HTTP {response.status_code}: {response.text}"
+            logger.error(f"  ✗ {error}")
+            return [job_result(package, error=error) for package in packages]
+
+        data = result.get("data") or {}
+
+        # Field errors carry the alias as the first path element
+        errors_by_alias = {}
+        for error in result.get("errors") or []:
+            path = error.get("path") or [None]
+            errors_by_alias.setdefault(path[0], []).append(error.get("message"))
+
+        if None in errors_by_alias:
+            logger.error(f"  ✗ GraphQL errors: {errors_by_alias[None]}")
+
+        results = []
+        for i, package in enumerate(packages):
+            alias = f"job{i}"
+            job_data = data.get(alias)
+            error = None if job_data else str(errors_by_alias.get(alias) or errors_by_alias.get(None))
+            results.append(job_result(package, job_data, error))
+
+        return results
 
     except Exception as e:
-        print(f"  ✗ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
+        logger.exception(f"  ✗ Error: {str(e)}")
+        return [job_result(package, error=str(e)) for package in packages]
+
+
+def create_scanner_jobs_concurrent(packages):
+    """
+    Create scanner jobs with one request per package, sent concurrently
+
+    Requests run on a thread pool bounded by MAX_CONCURRENT_JOBS and are
+    paced by submit_rate_limiter. Used when JOB_SUBMIT_MODE=concurrent.
+
+    Args:
+        packages: List of (id, package_name, version, python_version) row tuples
+
+    Returns:
+        list: One outcome record per package (see job_result)
+    """
+    if not packages:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_JOBS, len(packages))) as executor:
+        futures = [executor.submit(create_scanner_job_graphql, package) for package in packages]
+        return [future.result() for future in as_completed(futures)]
+
+
+def get_running_jobs_count():
+    """Count running scanner jobs from the source selected by RUNNING_JOBS_SOURCE"""
+    if RUNNING_JOBS_SOURCE == "graphql":
+        prefix = "scanner"
+        status = "in progress"
 
+        logger.info(f"🔢 Advanced Count:")
+        logger.info(f"   Prefix: {prefix}")
+        if status:
+            logger.info(f"   Status: {status}")
 
+        return count_jobs_advanced(
+            prefix=prefix,
+            status=status,
+            job_type="",
+            immediate_only=True
+        )
+
+    logger.info(f"🔢 Counting in-flight packages in database")
+    return count_in_flight_packages()
 
 
 def main():
     """Main execution function"""
 
-    # 1. Check running jobs (with Istio retry logic)
-    prefix = "scanner"
-    status = "in progress"
+    logger.info(f"GraphQL API URL: {HYPERPLANE_GRAPHQL_URL}")
+    logger.info(f"Database URL: {DATABASE_URL.split('@')[0].split(':')[0]}:***@{DATABASE_URL.split('@')[1]}")
 
-    print(f"\n🔢 Advanced Count:")
-    print(f"   Prefix: {prefix}")
-    if status:
-        print(f"   Status: {status}")
+    logger.info("=" * 60)
+    logger.info("Package Scanner Job Manager")
+    logger.info("=" * 60)
+    logger.info(f"Started at: {datetime.utcnow().isoformat()}")
 
-    running_jobs = count_jobs_advanced(
-        prefix=prefix,
-        status=status,
-        job_type="",
-        immediate_only=True
-    )
+    # 0. Re-queue packages whose job died without reporting a result
+    reclaim_stale_packages()
 
-    if running_jobs is not None:
-        print(f"\n   Result: {running_jobs} jobs")
+    # 1. Check running jobs
+    # The count is fetched once per run; slots are then tracked locally as
+    # jobs are created.
+    running_jobs = get_running_jobs_count()
 
+    if running_jobs is None:
+        logger.error("Could not determine running jobs, skipping this run.")
+        return
 
+    logger.info(f"   Result: {running_jobs} jobs")
 
     # 2. Calculate available slots
     available_slots = MAX_CONCURRENT_JOBS - running_jobs
 
     if available_slots <= 0:
-        print(f"No available slots. All {MAX_CONCURRENT_JOBS} job slots are in use.")
+        logger.info(f"No available slots. All {MAX_CONCURRENT_JOBS} job slots are in use.")
         return
 
-    print(f"Available job slots: {available_slots}")
-    print()
+    logger.info(f"Available job slots: {available_slots}")
+
+    # 3. Claim as many pending packages as there are free slots
+    pending_packages = claim_pending_packages(available_slots)
 
-    # 3. Fetch pending packages
-    pending_packages = get_pending_packages(available_slots)
-   
     if not pending_packages:
-        print("No pending packages found in database.")
+        logger.info("No pending packages found in database.")
         return
 
     # 4. Create jobs
-    print(f"Step 3: Creating jobs...")
-    print()
+    logger.info(f"Step 3: Creating jobs...")
 
-    created_count = 0
-    for package in pending_packages:
-        # Use GraphQL API (appears in Hyperplane UI)
-        success = create_scanner_job_graphql(package)
+    # Use GraphQL API (appears in Hyperplane UI)
+    if JOB_SUBMIT_MODE == "concurrent":
+        results = create_scanner_jobs_concurrent(pending_packages)
+    else:
+        results = create_scanner_jobs_batch(pending_packages)
+    created_count = sum(1 for result in results if result["job_id"])
+    available_slots -= created_count
 
-        if success:
-            created_count += 1
+    # Packages without a job go back to pending for the next run
+    release_packages([result["id"] for result in results if not result["job_id"]])
 
-    # 5. Summary
-    print()
-    print("=" * 60)
-    print("Summary:")
-    print(f"  - Running jobs before: {running_jobs}")
-    print(f"  - Jobs created: {created_count}")
-    print(f"  - Total running jobs now: {running_jobs + created_count}")
-    print("=" * 60)
+    # 5. Summary - one structured line instead of per-package output
+    logger.info(json.dumps({"run_summary": {
+        "running_before": running_jobs,
+        "created": created_count,
+        "running_now": running_jobs + created_count,
+        "available_slots": available_slots,
+        "results": results
+    }}))
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
     try:
         main()
     except Exception as e:
-        print(f"\n✗ Fatal error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"✗ Fatal error: {str(e)}")
         exit(1)
+    finally:
+        close_db_pool()
+        http_session.close()
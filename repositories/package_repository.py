@@ -3,15 +3,63 @@ Package repository for database operations
 """
 
 import logging
-from typing import Optional, List
-from sqlalchemy import func
+from datetime import datetime
+from typing import Optional, List, Tuple
+from sqlalchemy import bindparam, func, select, tuple_, update
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from models.package import Package
 from flask import g
 
 logger = logging.getLogger(__name__)
 
+# Hot lookups built once; values are bound per call, so every execution
+# reuses the same statement object and its cached compiled SQL
+FIND_BY_NAME = (
+    select(Package)
+    .where(Package.package_name == bindparam('package_name'))
+    .order_by(Package.created_at.desc())
+    .limit(1)
+)
+FIND_BY_NAME_AND_VERSION = (
+    select(Package)
+    .where(Package.package_name == bindparam('package_name'), Package.version == bindparam('version'))
+    .limit(1)
+)
+# Status lookups for /simple/<name>/ only need these two columns
+FIND_STATUS_BY_NAME_AND_VERSION = (
+    select(Package.status, Package.vulnerability_info)
+    .where(Package.package_name == bindparam('package_name'), Package.version == bindparam('version'))
+    .limit(1)
+)
+FIND_STATUS_BY_NAME_LATEST = (
+    select(Package.status, Package.vulnerability_info)
+    .where(
+        Package.package_name == bindparam('package_name'),
+        (Package.version == "latest") | (Package.version.is_(None))
+    )
+    .limit(1)
+)
+
+# Bulk export: Postgres formats the CSV itself, no per-row Python work
+COPY_ALL_CSV = """
+    COPY (
+        SELECT id, package_name, version, python_version, status,
+               error_message, created_at, updated_at
+        FROM packages
+        ORDER BY created_at DESC, id DESC
+    ) TO STDOUT WITH (FORMAT csv, HEADER)
+"""
+FIND_BY_NAME_LATEST = (
+    select(Package)
+    .where(
+        Package.package_name == bindparam('package_name'),
+        (Package.version == "latest") | (Package.version.is_(None))
+    )
+    .limit(1)
+)
+
 
 class PackageRepository:
     """Repository for package database operations"""
@@ -25,9 +73,7 @@ class PackageRepository:
     def find_by_name(self, package_name: str) -> Optional[Package]:
         """Find package by name (returns latest version or first match)"""
         try:
-            return self.db.query(Package).filter(
-                Package.package_name == package_name
-            ).order_by(Package.created_at.desc()).first()
+            return self.db.scalars(FIND_BY_NAME, {'package_name': package_name}).first()
         except Exception as e:
             logger.error(f"Error finding package '{package_name}': {e}", exc_info=True)
             return None
@@ -35,21 +81,31 @@ class PackageRepository:
     def find_by_name_and_version(self, package_name: str, version: Optional[str]) -> Optional[Package]:
         """Find package by name and version"""
         try:
-            query = self.db.query(Package).filter(Package.package_name == package_name)
-
             if version:
-                query = query.filter(Package.version == version)
-            else:
-                # If no version specified, look for "latest" or None
-                query = query.filter(
-                    (Package.version == "latest") | (Package.version.is_(None))
-                )
+                return self.db.scalars(
+                    FIND_BY_NAME_AND_VERSION, {'package_name': package_name, 'version': version}
+                ).first()
 
-            return query.first()
+            # If no version specified, look for "latest" or None
+            return self.db.scalars(FIND_BY_NAME_LATEST, {'package_name': package_name}).first()
         except Exception as e:
             logger.error(f"Error finding package '{package_name}' version '{version}': {e}", exc_info=True)
             return None
 
+    def find_status(self, package_name: str, version: Optional[str]) -> Optional[Row]:
+        """Find (status, vulnerability_info) by name and version, without loading the full row"""
+        try:
+            if version:
+                return self.db.execute(
+                    FIND_STATUS_BY_NAME_AND_VERSION, {'package_name': package_name, 'version': version}
+                ).first()
+
+            # If no version specified, look for "latest" or None
+            return self.db.execute(FIND_STATUS_BY_NAME_LATEST, {'package_name': package_name}).first()
+        except Exception as e:
+            logger.error(f"Error finding status of '{package_name}' version '{version}': {e}", exc_info=True)
+            return None
+
     def create(
         self,
         package_name: str,
@@ -57,53 +113,118 @@ class PackageRepository:
         python_version: Optional[str] = None,
         status: str = 'pending'
     ) -> Optional[Package]:
-        """Create new package with version information"""
+        """
+        Create new package with version information
+
+        Uses INSERT ... ON CONFLICT DO NOTHING RETURNING, so a new package
+        costs one round trip and a concurrent duplicate never raises; the
+        existing row is looked up only when the insert was skipped.
+        """
         try:
-            package = Package(
-                package_name=package_name,
-                version=version or "latest",
-                python_version=python_version,
-                status=status
+            stmt = (
+                pg_insert(Package)
+                .values(
+                    package_name=package_name,
+                    version=version or "latest",
+                    python_version=python_version,
+                    status=status
+                )
+                .on_conflict_do_nothing(index_elements=['package_name', 'version'])
+                .returning(Package)
             )
-            self.db.add(package)
+            package = self.db.scalars(stmt).first()
             self.db.commit()
-            self.db.refresh(package)
+
+            if package is None:
+                logger.warning(f"Package already exists: {package_name}=={version}")
+                return self.find_by_name_and_version(package_name, version)
             return package
-        except IntegrityError:
-            self.db.rollback()
-            logger.warning(f"Package already exists: {package_name}=={version}")
-            return self.find_by_name_and_version(package_name, version)
         except Exception as e:
             self.db.rollback()
             logger.error(f"Error creating package '{package_name}=={version}': {e}", exc_info=True)
             return None
 
+    def create_many(self, packages: List[dict], status: str = 'pending') -> int:
+        """
+        Create many packages in one multi-row INSERT ... ON CONFLICT DO NOTHING
+
+        Args:
+            packages: Dicts with package_name and optional version/python_version
+
+        Returns:
+            Number of rows inserted (existing package/version pairs are skipped)
+        """
+        if not packages:
+            return 0
+
+        try:
+            stmt = (
+                pg_insert(Package)
+                .values([
+                    {
+                        'package_name': package['package_name'],
+                        'version': package.get('version') or "latest",
+                        'python_version': package.get('python_version'),
+                        'status': status
+                    }
+                    for package in packages
+                ])
+                .on_conflict_do_nothing(index_elements=['package_name', 'version'])
+                .returning(Package.id)
+            )
+            inserted = len(self.db.execute(stmt).all())
+            self.db.commit()
+            return inserted
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error creating {len(packages)} packages: {e}", exc_info=True)
+            return 0
+
     def update_status(
         self, package_name: str, status: str, vulnerability_info: dict = None
     ) -> bool:
-        """Update package status"""
-        try:
-            package = self.find_by_name(package_name)
-            if not package:
-                return False
+        """
+        Update package status
 
-            package.status = status
+        Targets the same row find_by_name() returns (the newest for that
+        name) in a single UPDATE ... RETURNING, without loading it first.
+        """
+        try:
+            values = {'status': status}
             if vulnerability_info is not None:
-                package.vulnerability_info = vulnerability_info
+                values['vulnerability_info'] = vulnerability_info
+
+            latest_id = (
+                select(Package.id)
+                .where(Package.package_name == package_name)
+                .order_by(Package.created_at.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+            stmt = update(Package).where(Package.id == latest_id).values(**values).returning(Package.id)
 
+            updated = self.db.execute(stmt).first() is not None
             self.db.commit()
-            return True
+            return updated
         except Exception as e:
             self.db.rollback()
             logger.error(f"Error updating package '{package_name}': {e}", exc_info=True)
             return False
 
-    def find_pending(self, limit: int = 10) -> List[Package]:
-        """Find pending packages"""
+    def find_pending(self, limit: int = 10) -> List[Row]:
+        """
+        Find pending packages, oldest first (plain rows, see Package.row_to_dict)
+
+        Ordered like the scheduler's claim query, so both read
+        idx_packages_pending_created_id in index order instead of sorting.
+        """
         try:
-            return self.db.query(Package).filter(
-                Package.status == 'pending'
-            ).order_by(Package.created_at.asc()).limit(limit).all()
+            return self.db.execute(
+                select(Package.__table__)
+                .where(Package.status == 'pending')
+                .order_by(Package.created_at.asc(), Package.id.asc())
+                .limit(limit)
+            ).all()
         except Exception as e:
             logger.error(f"Error fetching pending packages: {e}", exc_info=True)
             return []
@@ -111,24 +232,50 @@ class PackageRepository:
     def count_by_status(self, status: str) -> int:
         """Count packages by status"""
         try:
-            return self.db.query(Package).filter(
-                Package.status == status
-            ).count()
+            return self.db.execute(
+                select(func.count()).select_from(Package).where(Package.status == status)
+            ).scalar()
         except Exception as e:
             logger.error(f"Error counting packages by status '{status}': {e}", exc_info=True)
             return 0
 
-    def find_all(self, limit: Optional[int] = None) -> List[Package]:
-        """Find all packages"""
+    def find_all(
+        self, limit: Optional[int] = None, after: Optional[Tuple[datetime, int]] = None
+    ) -> List[Row]:
+        """
+        Find all packages, newest first (plain rows, see Package.row_to_dict)
+
+        Args:
+            limit: Maximum rows to return
+            after: (created_at, id) of the last row of the previous page; the
+                   keyset condition is served by idx_packages_created_at_id
+        """
         try:
-            query = self.db.query(Package).order_by(Package.created_at.desc())
+            query = select(Package.__table__).order_by(Package.created_at.desc(), Package.id.desc())
+            if after is not None:
+                query = query.where(tuple_(Package.created_at, Package.id) < tuple_(*after))
             if limit:
                 query = query.limit(limit)
-            return query.all()
+            return self.db.execute(query).all()
         except Exception as e:
             logger.error(f"Error fetching all packages: {e}", exc_info=True)
             return []
 
+    def copy_all_csv(self, out) -> bool:
+        """
+        Write every package as CSV to a binary file object, newest first
+
+        Runs COPY ... TO STDOUT on the session's own psycopg2 connection.
+        """
+        try:
+            dbapi_conn = self.db.connection().connection
+            with dbapi_conn.cursor() as cursor:
+                cursor.copy_expert(COPY_ALL_CSV, out)
+            return True
+        except Exception as e:
+            logger.error(f"Error exporting packages as CSV: {e}", exc_info=True)
+            return False
+
     def get_status_stats(self) -> dict:
         """Get package count statistics by status"""
         try:
@@ -138,13 +285,13 @@ class PackageRepository:
                 func.count(Package.id).label('count')
             ).group_by(Package.status).all()
 
+            # status is NOT NULL, so the groups cover every row and the
+            # total is their sum (no second COUNT query needed)
             stats = {row.status: row.count for row in results}
-
-            # Get total count
-            total = self.db.query(func.count(Package.id)).scalar()
+            total = sum(stats.values())
 
             return {
-                'total': total or 0,
+                'total': total,
                 'by_status': stats
             }
         except Exception as e:
@@ -2,16 +2,94 @@
 JSON API routes for package information
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, g, jsonify, request
 import requests
 import logging
 
 from config import Config
+from database import get_session
 from controllers.package_controller import PackageController
+from utils.ttl_cache import TTLCache
+from utils.single_flight import SingleFlight
+from utils.http_session import CONNECT_TIMEOUT, pypi_session
+from utils.json_provider import json_loads
+from utils.version_parser import version_sort_key
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
 
+# Page size bounds for /api/db/packages
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Fields of the PyPI JSON API "info" object returned by /api/package/<name>
+PACKAGE_INFO_KEYS = (
+    'name', 'version', 'summary', 'description', 'author', 'author_email',
+    'license', 'home_page', 'project_url', 'package_url', 'requires_python', 'keywords'
+)
+
+# Package summaries (the PACKAGE_INFO_KEYS projection and the sorted version
+# list) shared by the info and versions routes. The full JSON document, with
+# its per-file releases map, is never kept.
+package_summary_cache = TTLCache(maxsize=Config.PACKAGE_SUMMARY_CACHE_SIZE, ttl=Config.PYPI_CACHE_TTL)
+
+# Concurrent cache misses for the same package share one upstream request
+package_summary_fetches = SingleFlight()
+
+
+def fetch_package_summary(package_name: str):
+    """Fetch a PyPI JSON API document and cache its summary; None if the package doesn't exist"""
+    url = f"{Config.PYPI_SERVER_URL}/{package_name}/json"
+    logger.info(f"Requesting package JSON: {url}")
+    response = pypi_session.get(url, timeout=(CONNECT_TIMEOUT, 10))
+
+    logger.info(f"Response status: {response.status_code}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Response headers: {dict(response.headers)}")
+
+    if response.status_code == 404:
+        return None
+
+    response.raise_for_status()
+    data = json_loads(response.content)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Response data keys: {list(data.keys())}")
+
+    info = data.get('info', {})
+    summary = {
+        "info": {key: info.get(key) for key in PACKAGE_INFO_KEYS},
+        "versions": sorted(data.get('releases', {}), key=version_sort_key, reverse=True)
+    }
+    package_summary_cache.set(package_name, summary)
+    return summary
+
+
+def get_package_summary(package_name: str):
+    """Cached summary ({"info", "versions"}) of a package; None if the package doesn't exist"""
+    summary = package_summary_cache.get(package_name)
+    if summary is None:
+        summary = package_summary_fetches.do(package_name, lambda: fetch_package_summary(package_name))
+    return summary
+
+# -----------------------
+# DB session management
+# -----------------------
+
+@api_bp.before_request
+def open_db_session():
+    """Open a DB session before each request"""
+    g.db = get_session()
+
+
+@api_bp.teardown_request
+def close_db_session(exception=None):
+    """Close the DB session after each request (the /api/db routes are read-only)"""
+    db = getattr(g, "db", None)
+    if db is not None:
+        db.rollback()
+        db.close()
+
+
 
 @api_bp.route('/package/<package_name>')
 def get_package_info(package_name: str):
@@ -19,43 +97,17 @@ def get_package_info(package_name: str):
     Get detailed information about a Python package
     """
     try:
-        url = f"{Config.PYPI_SERVER_URL}/{package_name}/json"
-        logger.info(f"Requesting package info: {url}")
-        response = requests.get(url, timeout=10)
-
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Response headers: {dict(response.headers)}")
-
-        if response.status_code == 404:
+        summary = get_package_summary(package_name)
+        if summary is None:
             logger.warning(f"Package not found: {package_name}")
             return jsonify({
                 "error": "Package not found",
                 "package_name": package_name
             }), 404
 
-        response.raise_for_status()
-        data = response.json()
-        logger.info(f"Response data keys: {list(data.keys())}")
-
-        info = data.get('info', {})
-        result = {
-            "name": info.get('name'),
-            "version": info.get('version'),
-            "summary": info.get('summary'),
-            "description": info.get('description'),
-            "author": info.get('author'),
-            "author_email": info.get('author_email'),
-            "license": info.get('license'),
-            "home_page": info.get('home_page'),
-            "project_url": info.get('project_url'),
-            "package_url": info.get('package_url'),
-            "requires_python": info.get('requires_python'),
-            "keywords": info.get('keywords'),
-        }
-
-        return jsonify(result), 200
+        return jsonify(summary["info"]), 200
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"Failed to fetch package info for {package_name}: {str(e)}")
         return jsonify({
             "error": "Failed to fetch package information",
@@ -69,37 +121,26 @@ def get_package_versions(package_name: str):
     Get all available versions of a Python package
     """
     try:
-        url = f"{Config.PYPI_SERVER_URL}/{package_name}/json"
-        logger.info(f"Requesting package versions: {url}")
-        response = requests.get(url, timeout=10)
-
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Response headers: {dict(response.headers)}")
-
-        if response.status_code == 404:
+        summary = get_package_summary(package_name)
+        if summary is None:
             logger.warning(f"Package not found: {package_name}")
             return jsonify({
                 "error": "Package not found",
                 "package_name": package_name
             }), 404
 
-        response.raise_for_status()
-        data = response.json()
-        logger.info(f"Response data keys: {list(data.keys())}")
-
-        releases = data.get('releases', {})
-        versions = list(releases.keys())
+        versions = summary["versions"]
 
         result = {
             "package_name": package_name,
             "total_versions": len(versions),
-            "versions": sorted(versions, reverse=True),
-            "latest_version": data.get('info', {}).get('version')
+            "versions": versions,
+            "latest_version": summary["info"]["version"]
         }
 
         return jsonify(result), 200
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"Failed to fetch package versions for {package_name}: {str(e)}")
         return jsonify({
             "error": "Failed to fetch package versions",
@@ -131,10 +172,20 @@ def search_packages():
 @api_bp.route('/db/packages')
 def list_db_packages():
     """
-    List all packages in database
+    List packages in database, newest first, one page at a time
+
+    Query params:
+        limit: Page size (default 100, max 1000)
+        after: The 'next' cursor returned by the previous page
+        format: 'csv' to download every package as CSV instead (ignores paging)
     """
     controller = PackageController.create_with_db()
-    return controller.list_all_packages()
+    if request.args.get('format') == 'csv':
+        return controller.export_packages_csv()
+
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return controller.list_all_packages(limit, request.args.get('after'))
 
 
 @api_bp.route('/db/packages/pending')
@@ -3,54 +3,73 @@ Package download routes
 Handles package file downloads from PyPI server
 """
 
-from flask import Blueprint, request, Response
+import os
+from flask import Blueprint, request, Response, send_file
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
 import requests
 import logging
 
 from config import Config
+from utils.http_session import CONNECT_TIMEOUT, pypi_session
 
 packages_bp = Blueprint('packages', __name__, url_prefix='/packages')
 logger = logging.getLogger(__name__)
 
+# Read size when relaying package files to the client
+DOWNLOAD_BUFFER_SIZE = 64 * 1024
+
 
 @packages_bp.route('/<path:filename>')
 def download_package(filename: str):
     """
     Package file download endpoint
-    Proxies package files from the PyPI server
+    Serves package files from PYPI_PACKAGES_DIR when mounted, otherwise
+    proxies them from the PyPI server
     """
     try:
-        # Log all incoming request headers from pip
-        logger.info(f"=== Incoming Package Download Request ===")
-        logger.info(f"Filename: {filename}")
-        logger.info(f"Request Headers: {dict(request.headers)}")
-        logger.info(f"Request Method: {request.method}")
-        logger.info(f"Request Remote Address: {request.remote_addr}")
+        logger.info(f"📦 Download request: {filename} from {request.remote_addr}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Request Headers: {dict(request.headers)}")
+
+        # Local file: let the WSGI server send it (sendfile, Range, conditional GET)
+        if Config.PYPI_PACKAGES_DIR:
+            local_path = safe_join(Config.PYPI_PACKAGES_DIR, filename)
+            if local_path and os.path.isfile(local_path):
+                return send_file(local_path, as_attachment=True, conditional=True)
 
         # Proxy from PyPI server
         url = f"{Config.PYPI_SERVER_URL}/packages/{filename}"
-        logger.info(f"Proxying to: {url}")
+        response = pypi_session.get(url, stream=True, timeout=(CONNECT_TIMEOUT, 30))
 
-        response = requests.get(url, stream=True, timeout=30)
-
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Response headers: {dict(response.headers)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Upstream {url} → {response.status_code}, headers: {dict(response.headers)}")
 
         if response.status_code == 404:
             logger.warning(f"Package file not found: {filename}")
+            response.close()
             return Response("File not found", status=404)
 
         response.raise_for_status()
 
-        # Stream the file back to the client
-        return Response(
-            response.iter_content(chunk_size=8192),
+        # Relay the upstream body as-is: no decompression, large reads, and
+        # Content-Encoding forwarded so Content-Length still matches
+        response.raw.decode_content = False
+        headers = {
+            'Content-Disposition': response.headers.get('content-disposition', ''),
+            'Content-Length': response.headers.get('content-length', '')
+        }
+        if 'content-encoding' in response.headers:
+            headers['Content-Encoding'] = response.headers['content-encoding']
+
+        proxied = Response(
+            wrap_file(request.environ, response.raw, buffer_size=DOWNLOAD_BUFFER_SIZE),
             content_type=response.headers.get('content-type', 'application/octet-stream'),
-            headers={
-                'Content-Disposition': response.headers.get('content-disposition', ''),
-                'Content-Length': response.headers.get('content-length', '')
-            }
+            headers=headers,
+            direct_passthrough=True
         )
+        proxied.call_on_close(response.close)
+        return proxied
 
     except requests.RequestException as e:
         logger.error(f"Failed to download package file {filename}: {str(e)}")
@@ -4,16 +4,25 @@ Clean architecture: Route -> Controller -> Service -> Repository -> Model
 """
 
 import logging
-import requests
+import threading
 from flask import Blueprint, Response, g, request
 from config import Config
 from database import get_session
 from controllers.package_controller import PackageController
 from utils.version_parser import parse_python_version, parse_package_and_version
+from utils.http_session import CONNECT_TIMEOUT, pypi_session
 
 logger = logging.getLogger(__name__)
 simple_api_bp = Blueprint('simple_api', __name__, url_prefix='/simple')
 
+# Last /simple/ index fetched from the PyPI server, revalidated with a
+# conditional GET so an unchanged index costs a 304 instead of the full page
+_index_cache = {'etag': None, 'last_modified': None, 'body': None, 'headers': None}
+_index_cache_lock = threading.Lock()
+
+# Upstream headers that don't apply to the (decoded) body we send on
+_SKIPPED_PROXY_HEADERS = ("transfer-encoding", "content-encoding", "content-length")
+
 # -----------------------
 # DB session management
 # -----------------------
@@ -75,10 +84,34 @@ def simple_index():
     Lists all available packages (proxy to PyPI server)
     """
     try:
-        response = requests.get(f"{Config.PYPI_SERVER_URL}/simple/", timeout=10)
+        with _index_cache_lock:
+            cached = dict(_index_cache)
+
+        conditional_headers = {}
+        if cached['etag']:
+            conditional_headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            conditional_headers['If-Modified-Since'] = cached['last_modified']
+
+        response = pypi_session.get(
+            f"{Config.PYPI_SERVER_URL}/simple/", headers=conditional_headers, timeout=(CONNECT_TIMEOUT, 10)
+        )
+
+        if response.status_code == 304 and cached['body'] is not None:
+            return Response(cached['body'], status=200, headers=cached['headers'])
+
         # Filter headers to avoid problematic ones like Transfer-Encoding
         headers = {k: v for k, v in response.headers.items()
-                   if k.lower() not in ("transfer-encoding", "content-encoding")}
+                   if k.lower() not in _SKIPPED_PROXY_HEADERS}
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified):
+            with _index_cache_lock:
+                _index_cache.update(
+                    etag=etag, last_modified=last_modified, body=response.content, headers=headers
+                )
+
         return Response(response.content, status=response.status_code, headers=headers)
     except Exception as e:
         logger.error(f"PyPI server error: {e}", exc_info=True)
@@ -7,17 +7,31 @@ Updates database with scan results
 
 import sys
 import os
+import time
+import fcntl
+import shutil
+import traceback
 import subprocess
 import tempfile
 import json
+import hashlib
+import functools
 import psycopg2
-from datetime import datetime
+import requests
+from datetime import datetime, timedelta
 from pathlib import Path
 import glob
 import re
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Package Status Constants (matching models/package.py PackageStatus enum)
 STATUS_PENDING = "pending"           # Waiting for scan job to start
+STATUS_DISPATCHED = "dispatched"     # Scan job created, waiting for it to run
 STATUS_DOWNLOADED = "downloaded"     # Downloaded from external PyPI
 STATUS_COMPLETED = "completed"       # Scanned, safe, uploaded to internal PyPI
 STATUS_VULNERABLE = "vulnerable"     # Has vulnerabilities (blocked)
@@ -40,20 +54,62 @@ PYPI_SERVER_URL = os.getenv(
 PYPI_USERNAME = os.getenv('PYPI_USERNAME', 'username')
 PYPI_PASSWORD = os.getenv('PYPI_PASSWORD', 'password')
 
+# Upload with the twine CLI instead of posting to the PyPI server directly
+UPLOAD_WITH_TWINE = os.getenv('UPLOAD_WITH_TWINE', 'false').lower() == 'true'
+
 # Target Python version for this scan (from pip request)
 # Format: "3.10" or "3.11" (major.minor)
 TARGET_PYTHON_VERSION = os.getenv('PYTHON_VERSION', '3.11')  # Default to 3.11
 
+# Shared volume for per-Python-version download venvs, reused across scan
+# jobs and rebuilt weekly. Unset = build a throwaway venv in every scan.
+VENV_CACHE_DIR = os.getenv('VENV_CACHE_DIR', '')
+
+# Upstream PyPI JSON API, used to resolve the latest version of a bare package name
+PYPI_JSON_URL = os.getenv('PYPI_JSON_URL', 'https://pypi.org/pypi').rstrip('/')
+
+# Trivy server (e.g. http://trivy.trivy.svc.cluster.local:4954) to scan in
+# client mode against its already-loaded vulnerability DB. Unset = standalone.
+TRIVY_SERVER_URL = os.getenv('TRIVY_SERVER_URL', '')
+
 # Disable scanning for testing
 DISABLE_SCAN_AUDIT = os.getenv('DISABLE_SCAN_AUDIT', 'false').lower() == 'true'
 
 
+# Package files that work across all Python versions
+UNIVERSAL_SUFFIXES = ('.tar.gz', '-py3-none-any.whl', '-py2.py3-none-any.whl')
+
+# Oldest venv pip trusted to run the download as-is; older ones get upgraded
+PIP_MIN_VERSION = (23, 0)
+PIP_VERSION_RE = re.compile(r'^pip (\d+)\.(\d+)')
+
+# "name==version" or a bare "name" (latest): a PEP 508 project name and an
+# optional version without spaces or '='
+PACKAGE_SPEC_RE = re.compile(r'\A([A-Za-z0-9][A-Za-z0-9._-]*)(?:==([^\s=]+))?\Z')
+# Leading project name of any spec, for status updates when the spec is invalid
+PACKAGE_NAME_RE = re.compile(r'\A\s*([A-Za-z0-9][A-Za-z0-9._-]*)')
+
+
 def log(message):
-    """Print timestamped log message"""
-    timestamp = datetime.utcnow().isoformat()
+    """Print timestamped log message (UTC)"""
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
     print(f"[{timestamp}] {message}")
 
 
+def json_dumps(obj):
+    """Serialize to a JSON string, using orjson when available"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+def json_loads(data):
+    """Parse JSON bytes or str, using orjson when available"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def is_universal_package(package_file):
     """
     Check if a package file is universal (works across all Python versions)
@@ -62,75 +118,202 @@ def is_universal_package(package_file):
       - *-py3-none-any.whl (universal wheel)
       - *-py2.py3-none-any.whl (Python 2+3 universal)
     """
-    filename = os.path.basename(package_file)
-
-    if filename.endswith('.tar.gz'):
-        return True
-
-    if filename.endswith('-py3-none-any.whl'):
-        return True
-
-    if filename.endswith('-py2.py3-none-any.whl'):
-        return True
-
-    return False
+    # Suffixes can't span a path separator, so no basename() needed
+    return package_file.endswith(UNIVERSAL_SUFFIXES)
 
 
 def parse_package_spec(package_spec):
-    """Parse package specification in format: packagename==version"""
-    match = re.match(r'^(.+)==(.+)$', package_spec)
+    """Parse package specification in format: packagename==version or packagename (version None)"""
+    match = PACKAGE_SPEC_RE.match(package_spec)
     if match:
         return match.group(1), match.group(2)
     else:
-        raise ValueError(f"Invalid package specification: {package_spec}. Expected format: packagename==version")
+        raise ValueError(f"Invalid package specification: {package_spec}. Expected format: packagename==version or packagename")
+
+
+def resolve_latest_version(package_name):
+    """Latest release of a package on upstream PyPI, or None if it can't be found"""
+    try:
+        response = requests.get(f"{PYPI_JSON_URL}/{package_name}/json", timeout=(10, 30))
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return json_loads(response.content)['info']['version'] or None
+    except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+        log(f"❌ Could not resolve latest version of {package_name}: {str(e)}")
+        return None
+
+
+# One connection reused by every status update of this scan run
+_db_conn = None
+
+
+def get_db_connection():
+    """Return the shared database connection, (re)connecting if needed"""
+    global _db_conn
+
+    if _db_conn is not None and not _db_conn.closed:
+        return _db_conn
+
+    # Add retry logic for Istio
+    max_retries = 3
+    retry_delay = 2
+
+    for attempt in range(max_retries):
+        try:
+            _db_conn = psycopg2.connect(DATABASE_URL, connect_timeout=10)
+            return _db_conn
+        except psycopg2.OperationalError as e:
+            if attempt < max_retries - 1:
+                log(f"Database connection attempt {attempt + 1} failed, retrying in {retry_delay}s...")
+                time.sleep(retry_delay)
+            else:
+                raise
+
+
+def close_db_connection():
+    """Close the shared database connection if open"""
+    global _db_conn
+
+    if _db_conn is not None:
+        _db_conn.close()
+        _db_conn = None
+
+
+# The 'downloaded' progress update keeps error_message, so the scheduler's
+# stale-claim marker survives and a retry that dies mid-scan is still capped
+UPDATE_STATUS_SQL = """
+    UPDATE packages
+    SET status = %(status)s,
+        vulnerability_info = %(vulnerability_info)s,
+        error_message = CASE WHEN %(status)s = 'downloaded'
+                             THEN error_message ELSE %(error_message)s END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE package_name = %(package_name)s
+"""
 
 
 def update_package_status(package_name, status, vulnerability_info=None, error_message=None):
     """Update package status in database"""
-    try:
-        # Add retry logic for Istio
-        import time
-        max_retries = 3
-        retry_delay = 2
+    # The shared connection sits idle during downloads and scans, and the
+    # proxy may drop it; a dropped connection is replaced and the update retried once
+    for attempt in range(2):
+        try:
+            conn = get_db_connection()
+
+            with conn.cursor() as cursor:
+                cursor.execute(UPDATE_STATUS_SQL, {
+                    "status": status,
+                    "vulnerability_info": vulnerability_info,
+                    "error_message": error_message,
+                    "package_name": package_name,
+                })
+
+            conn.commit()
+
+            log(f"✅ Updated {package_name} status to: {status}")
+            return True
+
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            close_db_connection()
+            if attempt == 0:
+                log(f"Database connection lost ({str(e).strip()}), reconnecting...")
+                continue
+            log(f"❌ Error updating database: {str(e)}")
+            return False
 
-        conn = None
-        for attempt in range(max_retries):
-            try:
-                conn = psycopg2.connect(DATABASE_URL, connect_timeout=10)
-                break
-            except psycopg2.OperationalError as e:
-                if attempt < max_retries - 1:
-                    log(f"Database connection attempt {attempt + 1} failed, retrying in {retry_delay}s...")
-                    time.sleep(retry_delay)
-                else:
-                    raise
-
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            UPDATE packages
-            SET status = %s,
-                vulnerability_info = %s,
-                error_message = %s,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE package_name = %s
-        """, (status, vulnerability_info, error_message, package_name))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        log(f"✅ Updated {package_name} status to: {status}")
-        return True
+        except Exception as e:
+            log(f"❌ Error updating database: {str(e)}")
+            # Drop the connection so the next update starts from a clean one
+            close_db_connection()
+            return False
 
-    except Exception as e:
-        log(f"❌ Error updating database: {str(e)}")
+
+@functools.lru_cache(maxsize=None)
+def find_python(python_version):
+    """Path of the python<version> interpreter on PATH, or None"""
+    return shutil.which(f"python{python_version}")
+
+
+def venv_pip_version(pip_cmd):
+    """(major, minor) of a venv's pip, or None if it can't be determined"""
+    result = subprocess.run([pip_cmd, "--version"], capture_output=True, text=True, timeout=30)
+    match = PIP_VERSION_RE.match(result.stdout)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def create_venv(python_cmd, venv_dir):
+    """Create a venv whose pip is at least PIP_MIN_VERSION"""
+    result = subprocess.run(
+        [python_cmd, "-m", "venv", venv_dir],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+
+    if result.returncode != 0:
         return False
 
+    # Upgrade pip in the venv only if the bundled one is too old; setuptools
+    # and wheel aren't needed, pip builds sdist metadata in an isolated env
+    pip_cmd = os.path.join(venv_dir, "bin", "pip")
+    if (venv_pip_version(pip_cmd) or (0, 0)) < PIP_MIN_VERSION:
+        log(f"   ⬆️  Upgrading pip in {venv_dir}")
+        subprocess.run(
+            [pip_cmd, "install", "--quiet", "--upgrade", "pip"],
+            capture_output=True,
+            timeout=120
+        )
+    return True
+
+
+def cached_venv_dir(python_version, when):
+    """Path of the shared venv for a Python version in the ISO week of `when`"""
+    year, week, _ = when.isocalendar()
+    return os.path.join(VENV_CACHE_DIR, f"venv_{python_version}_{year}w{week:02d}")
+
+
+def ensure_venv(python_version, python_cmd, download_dir):
+    """
+    Return a venv for downloading with this Python version, or None on failure
+
+    With VENV_CACHE_DIR set, the venv is shared through that volume: the
+    first scan of the week builds it under a file lock (safe across pods)
+    and later scans reuse it. Venvs older than last week are removed then.
+    """
+    if not VENV_CACHE_DIR:
+        venv_dir = os.path.join(download_dir, f"venv_{python_version}")
+        return venv_dir if create_venv(python_cmd, venv_dir) else None
+
+    now = datetime.utcnow()
+    venv_dir = cached_venv_dir(python_version, now)
+    ready_marker = os.path.join(venv_dir, ".ready")
+
+    if not os.path.exists(ready_marker):
+        os.makedirs(VENV_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(VENV_CACHE_DIR, f".venv_{python_version}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            # Another pod may have built it while we waited for the lock
+            if not os.path.exists(ready_marker):
+                log(f"   🔧 Building cached venv for Python {python_version}: {venv_dir}")
+                shutil.rmtree(venv_dir, ignore_errors=True)  # leftovers of an interrupted build
+                if not create_venv(python_cmd, venv_dir):
+                    return None
+                open(ready_marker, "w").close()
+
+                # Last week's venv may still be in use by a running scan
+                keep = {venv_dir, cached_venv_dir(python_version, now - timedelta(weeks=1))}
+                for stale_dir in glob.glob(os.path.join(VENV_CACHE_DIR, f"venv_{python_version}_*")):
+                    if stale_dir not in keep:
+                        shutil.rmtree(stale_dir, ignore_errors=True)
+
+    log(f"   ♻️  Using cached venv for Python {python_version}")
+    return venv_dir
+
 
 def download_package_for_python_version(package_name, package_version, python_version, download_dir):
     """Download a package using a specific Python version's pip"""
-    venv_dir = os.path.join(download_dir, f"venv_{python_version}")
     pkg_dir = os.path.join(download_dir, f"packages_{python_version}")
 
     os.makedirs(pkg_dir, exist_ok=True)
@@ -138,33 +321,20 @@ def download_package_for_python_version(package_name, package_version, python_ve
     log(f"   📥 Attempting download for Python {python_version}...")
 
     # Check if Python version is available
-    python_cmd = f"python{python_version}"
-    if subprocess.run(["which", python_cmd], capture_output=True).returncode != 0:
+    python_cmd = find_python(python_version)
+    if python_cmd is None:
         log(f"   ⚠️  Python {python_version} not available, skipping")
         return None
 
     try:
-        # Create virtual environment for this Python version
-        result = subprocess.run(
-            [python_cmd, "-m", "venv", venv_dir],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-
-        if result.returncode != 0:
+        # Virtual environment for this Python version
+        venv_dir = ensure_venv(python_version, python_cmd, download_dir)
+        if venv_dir is None:
             log(f"   ⚠️  Failed to create venv for Python {python_version}")
             return None
 
-        # Upgrade pip in the venv
-        pip_cmd = os.path.join(venv_dir, "bin", "pip")
-        subprocess.run(
-            [pip_cmd, "install", "--quiet", "--upgrade", "pip", "setuptools", "wheel"],
-            capture_output=True,
-            timeout=120
-        )
-
         # Download package using this venv's pip
+        pip_cmd = os.path.join(venv_dir, "bin", "pip")
         result = subprocess.run(
             [pip_cmd, "download", f"{package_name}=={package_version}",
              "--no-deps", "-d", pkg_dir, "--no-cache-dir"],
@@ -177,9 +347,15 @@ def download_package_for_python_version(package_name, package_version, python_ve
             log(f"   ⚠️  Download failed for Python {python_version}")
             return None
 
-        # Find what was downloaded
-        package_files = glob.glob(os.path.join(pkg_dir, "*.whl")) + \
-                       glob.glob(os.path.join(pkg_dir, "*.tar.gz"))
+        # Find what was downloaded (one directory pass; wheels before sdists)
+        wheels, sdists = [], []
+        with os.scandir(pkg_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".whl"):
+                    wheels.append(entry.path)
+                elif entry.name.endswith(".tar.gz"):
+                    sdists.append(entry.path)
+        package_files = wheels + sdists
 
         if package_files:
             package_file = package_files[0]
@@ -245,22 +421,23 @@ def scan_package_vulnerabilities(package_name, package_version, scan_dir):
         with open(reqfile, 'w') as f:
             f.write(f"{package_name}=={package_version}\n")
 
-        scan_output = os.path.join(scan_dir, "trivy_scan.json")
-
         # Run Trivy scan
         # --exit-code 1 = fail if vulnerabilities found
         # --severity CRITICAL,HIGH = only care about serious issues
+        # --server = client mode, skipping the local vulnerability DB load
+        cmd = ["trivy", "fs"]
+        if TRIVY_SERVER_URL:
+            cmd += ["--server", TRIVY_SERVER_URL]
+        cmd += [
+            "--exit-code", "1",
+            "--severity", "CRITICAL,HIGH",
+            "--format", "json",
+            scan_dir
+        ]
+        # The JSON report goes to stdout (logs go to stderr)
         result = subprocess.run(
-            [
-                "trivy", "fs",
-                "--exit-code", "1",
-                "--severity", "CRITICAL,HIGH",
-                "--format", "json",
-                "--output", scan_output,
-                scan_dir
-            ],
+            cmd,
             capture_output=True,
-            text=True,
             timeout=300
         )
 
@@ -272,15 +449,11 @@ def scan_package_vulnerabilities(package_name, package_version, scan_dir):
         log(f"   ❌ VULNERABILITIES DETECTED!")
 
         # Read scan results
-        vulnerabilities = {}
-        if os.path.exists(scan_output):
-            with open(scan_output, 'r') as f:
-                vulnerabilities = json.load(f)
+        vulnerabilities = json_loads(result.stdout) if result.stdout.strip() else {}
 
         return {
             "vulnerable": True,
-            "vulnerabilities": vulnerabilities,
-            "scan_output": json.dumps(vulnerabilities)
+            "vulnerabilities": vulnerabilities
         }
 
     except subprocess.TimeoutExpired:
@@ -294,10 +467,63 @@ def scan_package_vulnerabilities(package_name, package_version, scan_dir):
         return None
 
 
-def upload_to_pypi(package_file):
+# Session for uploads to the internal PyPI server
+upload_session = requests.Session()
+upload_session.auth = (PYPI_USERNAME, PYPI_PASSWORD)
+
+
+def upload_to_pypi(package_file, package_name, package_version):
+    """Upload package to internal PyPI server (legacy upload API, as twine does)"""
+    if UPLOAD_WITH_TWINE:
+        return upload_to_pypi_with_twine(package_file)
+
+    filename = os.path.basename(package_file)
+    try:
+        log(f"⬆️  Uploading to PyPI server: {filename}")
+
+        with open(package_file, "rb") as f:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+            f.seek(0)
+
+            response = upload_session.post(
+                f"{PYPI_SERVER_URL}/",
+                data={
+                    ":action": "file_upload",
+                    "protocol_version": "1",
+                    "name": package_name,
+                    "version": package_version,
+                    "sha256_digest": digest.hexdigest(),
+                },
+                files={"content": (filename, f, "application/octet-stream")},
+                timeout=(10, 120)
+            )
+
+        if not response.ok:
+            # pypiserver answers 409 when the file is already there (this is OK)
+            if response.status_code == 409 or "already exists" in response.text.lower():
+                log(f"ℹ️  Package already exists on PyPI server")
+                return True
+
+            log(f"❌ Upload failed: HTTP {response.status_code} {response.text[:500]}")
+            return False
+
+        log(f"✅ Successfully uploaded to PyPI server")
+        return True
+
+    except requests.Timeout:
+        log(f"❌ Upload timeout after 2 minutes")
+        return False
+    except Exception as e:
+        log(f"❌ Upload error: {str(e)}")
+        return False
+
+
+def upload_to_pypi_with_twine(package_file):
     """Upload package to internal PyPI server using twine"""
     try:
-        log(f"⬆️  Uploading to PyPI server: {os.path.basename(package_file)}")
+        log(f"⬆️  Uploading to PyPI server with twine: {os.path.basename(package_file)}")
 
         cmd = [
             "twine", "upload",
@@ -385,7 +611,7 @@ def scan_and_upload_package(package_name, package_version, python_version):
             # Package has vulnerabilities - update DB and DO NOT upload
             log(f"\n🔸 STEP 3: Update Database (VULNERABLE)")
 
-            vulnerability_info = json.dumps({
+            vulnerability_info = json_dumps({
                 "vulnerabilities": scan_result["vulnerabilities"],
                 "scanned_at": datetime.utcnow().isoformat(),
                 "scanner": "trivy"
@@ -403,7 +629,7 @@ def scan_and_upload_package(package_name, package_version, python_version):
             upload_success = True
             for package_file in package_files:
                 log(f"   Processing: {os.path.basename(package_file)}")
-                if not upload_to_pypi(package_file):
+                if not upload_to_pypi(package_file, package_name, package_version):
                     upload_success = False
 
             if not upload_success:
@@ -417,7 +643,7 @@ def scan_and_upload_package(package_name, package_version, python_version):
 
             log(f"\n🔸 STEP 4: Update Database (COMPLETED)")
 
-            vulnerability_info = json.dumps({
+            vulnerability_info = json_dumps({
                 "vulnerabilities": [],
                 "scanned_at": datetime.utcnow().isoformat(),
                 "scanner": "trivy",
@@ -470,18 +696,36 @@ def main():
     try:
         # Parse package specification
         package_name, package_version = parse_package_spec(package_spec)
-        log(f"   Parsed: {package_name} version {package_version}")
+        log(f"   Parsed: {package_name} version {package_version or 'latest'}")
+
+        if package_version is None:
+            package_version = resolve_latest_version(package_name)
+            if package_version is None:
+                update_package_status(
+                    package_name,
+                    STATUS_NOT_FOUND,
+                    error_message=f"Could not resolve the latest version of {package_name} on PyPI"
+                )
+                sys.exit(1)
+            log(f"   Resolved latest version: {package_version}")
 
         success = scan_and_upload_package(package_name, package_version, TARGET_PYTHON_VERSION)
         sys.exit(0 if success else 1)
 
     except ValueError as e:
         log(f"❌ Invalid package specification: {str(e)}")
+        # Record the failure so the row doesn't stay 'dispatched'
+        match = PACKAGE_NAME_RE.match(package_spec)
+        if match:
+            update_package_status(
+                match.group(1),
+                STATUS_ERROR,
+                error_message=f"Invalid package specification: {package_spec}"
+            )
         sys.exit(1)
 
     except Exception as e:
         log(f"💥 Fatal error: {str(e)}")
-        import traceback
         traceback.print_exc()
 
         # Try to update database with error
@@ -504,4 +748,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        close_db_connection()
@@ -2,20 +2,52 @@
 Package service for business logic
 """
 
+import codecs
 import logging
+import tempfile
 import requests
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple
 from repositories.package_repository import PackageRepository
+from models.package import Package, PackageStatus
 from config import Config
-
-try:
-    from bs4 import BeautifulSoup
-    HAS_BEAUTIFULSOUP = True
-except ImportError:
-    HAS_BEAUTIFULSOUP = False
+from utils.ttl_cache import TTLCache
+from utils.single_flight import SingleFlight
+from utils.http_session import CONNECT_TIMEOUT, pypi_session
+from services.pending_writer import pending_writer
+from utils.simple_index_parser import AnchorTextParser
 
 logger = logging.getLogger(__name__)
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# CSV exports stay in memory up to this size, then spill to a temp file
+CSV_EXPORT_SPOOL_SIZE = 4 * 1024 * 1024
+
+# Read size when streaming the /simple/ index into the parser
+INDEX_CHUNK_SIZE = 64 * 1024
+
+# Internal PyPI /simple/<name>/ pages that returned 200, as (content, headers).
+# Keyed by name only, so kept briefly: a version uploaded after its scan must
+# appear on the page within seconds
+simple_page_cache = TTLCache(maxsize=Config.PYPI_CACHE_SIZE, ttl=Config.SIMPLE_PAGE_CACHE_TTL)
+
+# Packages the internal PyPI answered 404 for, remembered only briefly so a
+# freshly uploaded package is seen within seconds. Errors are not cached.
+simple_page_misses = TTLCache(maxsize=Config.PYPI_CACHE_SIZE, ttl=Config.PYPI_NEGATIVE_CACHE_TTL)
+
+# Concurrent cache misses for the same package share one upstream request
+simple_page_fetches = SingleFlight()
+
+# Scan statuses by (package_name, version), absorbing pip's repeated probes
+# of blocked packages. Only terminal statuses are cached: in-progress ones
+# (pending/dispatched/downloaded) can turn into an error at any moment, and
+# a cached copy would keep answering 503 after the scan has finished.
+package_status_cache = TTLCache(maxsize=Config.PYPI_CACHE_SIZE, ttl=Config.STATUS_CACHE_TTL)
+CACHEABLE_STATUSES = frozenset({
+    PackageStatus.VULNERABLE.value,
+})
+
 
 class PackageService:
     """Service for package business logic"""
@@ -31,24 +63,43 @@ class PackageService:
             (True, content, headers) - Package available on PyPI
             (False, None, None) - Package not available
         """
+        cached = simple_page_cache.get(package_name)
+        if cached is not None:
+            logger.debug(f"✅ Package '{package_name}' found on internal PyPI (cached)")
+            return (True, *cached)
+
+        if simple_page_misses.get(package_name):
+            logger.debug(f"❌ Package '{package_name}' not found on internal PyPI (cached)")
+            return (False, None, None)
+
+        return simple_page_fetches.do(package_name, lambda: self._fetch_simple_page(package_name))
+
+    def _fetch_simple_page(self, package_name: str) -> Tuple[bool, Optional[bytes], Optional[dict]]:
+        """Fetch /simple/<name>/ from the internal PyPI server, caching hits and 404s"""
         try:
             pypi_url = f"{Config.PYPI_SERVER_URL}/simple/{package_name}/"
-            logger.info(f"🔍 Checking internal PyPI: {pypi_url}")
+            logger.debug(f"🔍 Checking internal PyPI: {pypi_url}")
 
-            response = requests.get(pypi_url, timeout=10)
+            response = pypi_session.get(pypi_url, timeout=(CONNECT_TIMEOUT, 10))
 
-            logger.info(f"📥 PyPI Response - Status: {response}")
-            logger.info(f"📥 PyPI Response - Content-Type: {response.headers.get('Content-Type', 'N/A')}")
-            logger.info(f"📥 PyPI Response - Content-Length: {len(response.content)} bytes")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"📥 PyPI Response - Status: {response}")
+                logger.debug(f"📥 PyPI Response - Content-Type: {response.headers.get('Content-Type', 'N/A')}")
+                logger.debug(f"📥 PyPI Response - Content-Length: {len(response.content)} bytes")
 
             if response.status_code == 200:
-                # Log first 1000 chars of HTML content for debugging
-                content_preview = response.text[:1000] if len(response.text) > 1000 else response.text
-                logger.info(f"📄 PyPI Response - Content preview:\n{content_preview}")
-                logger.info(f"✅ Package '{package_name}' found on internal PyPI")
-                return (True, response.content, dict(response.headers))
-
-            logger.info(f"❌ Package '{package_name}' not found on internal PyPI (status: {response.status_code})")
+                if logger.isEnabledFor(logging.DEBUG):
+                    # Log first 1000 chars of HTML content for debugging
+                    logger.debug(f"📄 PyPI Response - Content preview:\n{response.text[:1000]}")
+                logger.debug(f"✅ Package '{package_name}' found on internal PyPI")
+                headers = dict(response.headers)
+                simple_page_cache.set(package_name, (response.content, headers))
+                return (True, response.content, headers)
+
+            if response.status_code == 404:
+                simple_page_misses.set(package_name, True)
+
+            logger.debug(f"❌ Package '{package_name}' not found on internal PyPI (status: {response.status_code})")
             return (False, None, None)
 
         except requests.RequestException as e:
@@ -71,12 +122,20 @@ class PackageService:
             ('pending', None) - Package is being scanned
             ('unknown', None) - Package not in database
         """
-        package = self.package_repo.find_by_name_and_version(package_name, version)
+        cache_key = (package_name, version)
+        cached = package_status_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        if not package:
+        row = self.package_repo.find_status(package_name, version)
+
+        if not row:
             return ('unknown', None)
 
-        return (package.status, package.vulnerability_info)
+        result = (row.status, row.vulnerability_info)
+        if row.status in CACHEABLE_STATUSES:
+            package_status_cache.set(cache_key, result)
+        return result
 
     def add_package_for_scanning(
         self,
@@ -101,6 +160,17 @@ class PackageService:
             logger.error(f"Error adding package: {e}")
             return False
 
+    def queue_package_for_scanning(
+        self,
+        package_name: str,
+        version: Optional[str] = None,
+        python_version: Optional[str] = None
+    ) -> None:
+        """Add new package for scanning in the background, without waiting for the insert"""
+        if pending_writer.submit(package_name, version, python_version):
+            version_str = f"=={version}" if version else ""
+            logger.info(f"Queued package for scanning: {package_name}{version_str}")
+
     def get_pending_packages(self, limit: int = 10) -> list:
         """Get pending packages for scanning"""
         try:
@@ -126,14 +196,61 @@ class PackageService:
             logger.error(f"Error updating scan result: {e}")
             return False
 
-    def get_all_packages(self, limit: int = None) -> list:
-        """Get all packages from database"""
+    def get_all_packages(self, limit: int = None, cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """
+        Get one page of packages from database, newest first
+
+        Args:
+            limit: Page size
+            cursor: Opaque cursor from the previous page (None for the first page)
+
+        Returns:
+            (packages, next_cursor) - next_cursor is None on the last page
+
+        Raises:
+            ValueError: If cursor is malformed
+            OverflowError: If the cursor's timestamp is out of range
+        """
+        after = self.decode_page_cursor(cursor) if cursor else None
+
         try:
-            packages = self.package_repo.find_all(limit)
-            return [pkg.to_dict() for pkg in packages]
+            rows = self.package_repo.find_all(limit, after)
+            next_cursor = None
+            if limit and len(rows) == limit:
+                next_cursor = self.encode_page_cursor(rows[-1].created_at, rows[-1].id)
+            return ([Package.row_to_dict(row) for row in rows], next_cursor)
         except Exception as e:
             logger.error(f"Error fetching all packages: {e}")
-            return []
+            return ([], None)
+
+    @staticmethod
+    def encode_page_cursor(created_at: datetime, package_id: int) -> str:
+        """URL-safe cursor for keyset pagination: '<epoch microseconds>_<id>'"""
+        micros = (created_at - EPOCH) // timedelta(microseconds=1)
+        return f"{micros}_{package_id}"
+
+    @staticmethod
+    def decode_page_cursor(cursor: str) -> Tuple[datetime, int]:
+        """Inverse of encode_page_cursor; raises ValueError if malformed, OverflowError if out of range"""
+        micros, _, package_id = cursor.partition('_')
+        return (EPOCH + timedelta(microseconds=int(micros)), int(package_id))
+
+    def export_packages_csv(self):
+        """
+        Export all packages as CSV
+
+        The export is spooled before returning, so the DB connection is
+        released before the (possibly slow) client download starts.
+
+        Returns:
+            Binary file object positioned at the start, or None on failure
+        """
+        out = tempfile.SpooledTemporaryFile(max_size=CSV_EXPORT_SPOOL_SIZE)
+        if not self.package_repo.copy_all_csv(out):
+            out.close()
+            return None
+        out.seek(0)
+        return out
 
     def get_package_stats(self) -> dict:
         """Get package statistics"""
@@ -147,7 +264,7 @@ class PackageService:
         """Get detailed pending packages"""
         try:
             packages = self.package_repo.find_pending(limit=100)
-            return [pkg.to_dict() for pkg in packages]
+            return [Package.row_to_dict(row) for row in packages]
         except Exception as e:
             logger.error(f"Error fetching pending packages: {e}")
             return []
@@ -160,9 +277,6 @@ class PackageService:
             (True, packages_list, None) - Success
             (False, None, error_message) - Failure
         """
-        if not HAS_BEAUTIFULSOUP:
-            return (False, None, "beautifulsoup4 library is not installed")
-
         try:
             simple_url = f"{Config.PYPI_SERVER_URL}/simple/"
 
@@ -171,22 +285,21 @@ class PackageService:
             if Config.PYPI_USERNAME and Config.PYPI_PASSWORD:
                 auth = (Config.PYPI_USERNAME, Config.PYPI_PASSWORD)
 
-            # Fetch the simple index
-            response = requests.get(simple_url, auth=auth, timeout=10)
-
-            if response.status_code != 200:
-                return (False, None, f"PyPI server returned status {response.status_code}")
-
-            # Parse HTML to get package list
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a')
-
-            # Extract package names
-            packages = []
-            for link in links:
-                package_name = link.text.strip()
-                if package_name:
-                    packages.append(package_name)
+            # Fetch the simple index, parsing it as it arrives instead of
+            # holding the whole page (anchor texts only, no tree built)
+            with pypi_session.get(
+                simple_url, auth=auth, timeout=(CONNECT_TIMEOUT, 10), stream=True
+            ) as response:
+                if response.status_code != 200:
+                    return (False, None, f"PyPI server returned status {response.status_code}")
+
+                parser = AnchorTextParser()
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                for chunk in response.iter_content(INDEX_CHUNK_SIZE):
+                    parser.feed(decoder.decode(chunk))
+                parser.feed(decoder.decode(b'', final=True))
+                parser.close()
+                packages = parser.texts
 
             # Sort packages alphabetically
             packages.sort()
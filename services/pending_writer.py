@@ -0,0 +1,87 @@
+"""
+Background writer that queues packages for scanning off the request thread
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+
+from database import get_db_session
+from repositories.package_repository import PackageRepository
+
+logger = logging.getLogger(__name__)
+
+# How long the writer keeps collecting packages before writing a batch
+BATCH_WINDOW = 0.05
+MAX_BATCH_SIZE = 500
+
+
+class PendingPackageWriter:
+    """
+    Insert packages as 'pending' from a daemon thread
+
+    Submitting the same (package, version) again before it has been written
+    is a no-op, so a pip resolver storm costs one insert. Queued packages are
+    lost if the process dies first; pip retries and the next probe queues
+    them again.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, package_name: str, version: Optional[str] = None, python_version: Optional[str] = None) -> bool:
+        """Queue a package for insertion; False if it is already queued"""
+        key = (package_name, version or "latest")
+        with self._lock:
+            if key in self._queued:
+                return False
+            self._queued.add(key)
+
+            # Started on first use, so importing this module spawns nothing
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pending-package-writer", daemon=True)
+                self._thread.start()
+
+        self._queue.put((package_name, version, python_version))
+        return True
+
+    def _run(self):
+        """Drain the queue in batches, forever"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Failed to add {len(batch)} package(s) for scanning: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    for package_name, version, _ in batch:
+                        self._queued.discard((package_name, version or "latest"))
+
+    def _write(self, batch: list):
+        """Insert one batch of (package_name, version, python_version) in a single statement"""
+        with get_db_session() as session:
+            inserted = PackageRepository(session).create_many([
+                {'package_name': package_name, 'version': version, 'python_version': python_version}
+                for package_name, version, python_version in batch
+            ])
+        logger.info(f"Added {inserted} of {len(batch)} queued package(s) for scanning")
+
+
+# Process-wide writer used by PackageService
+pending_writer = PendingPackageWriter()
@@ -0,0 +1,42 @@
+"""
+Shared HTTP session for calls to the internal PyPI server
+"""
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+# Connections kept alive per upstream host; sized for concurrent request threads
+POOL_MAXSIZE = 32
+
+# The PyPI server is an in-cluster service: fail fast if it can't be reached,
+# and only give the read the longer per-call budget
+CONNECT_TIMEOUT = 2
+
+# Gateway errors from a restarting PyPI pod are worth one more try
+RETRY_STATUSES = (502, 503, 504)
+
+
+def create_session() -> requests.Session:
+    """
+    Build a keep-alive session with a pooled adapter
+
+    Idempotent requests (GET/HEAD) are retried twice on connection errors
+    and gateway errors with a short backoff; the last response is returned
+    as-is if retries run out.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=Retry(
+            total=2, backoff_factor=0.1, status_forcelist=RETRY_STATUSES, raise_on_status=False
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Module-level session shared by routes and services (requests.Session is
+# safe to share for plain GETs)
+pypi_session = create_session()
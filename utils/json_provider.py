@@ -0,0 +1,39 @@
+"""
+orjson-backed JSON provider for Flask responses
+"""
+
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def json_loads(data: bytes):
+    """Parse a JSON document (e.g. an upstream response body), with orjson when available"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Drop-in replacement for Flask's default provider using orjson
+
+    jsonify() and request.get_json() pick it up via app.json. Types orjson
+    can't encode natively fall back to Flask's default() hook.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
@@ -0,0 +1,36 @@
+"""
+Parser for PEP 503 simple index pages
+"""
+
+from html.parser import HTMLParser
+
+
+class AnchorTextParser(HTMLParser):
+    """
+    Collect the text of every <a> element
+
+    On a /simple/ index page that text is the project name. Can be fed the
+    page in chunks; results accumulate in `texts`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+        self._in_anchor = False
+        self._parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._in_anchor = True
+            self._parts = []
+
+    def handle_data(self, data):
+        if self._in_anchor:
+            self._parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._in_anchor:
+            self._in_anchor = False
+            text = ''.join(self._parts).strip()
+            if text:
+                self.texts.append(text)
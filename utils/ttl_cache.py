@@ -0,0 +1,54 @@
+"""
+Small in-process cache with per-entry expiry
+"""
+
+import time
+import threading
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire `ttl` seconds after being set
+
+    When full, expired entries are dropped first, then the oldest ones.
+    A ttl of 0 disables caching.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Cache a value for `ttl` seconds"""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.maxsize:
+                for stale in [k for k, (expires_at, _) in self._data.items() if expires_at <= now]:
+                    del self._data[stale]
+            while len(self._data) >= self.maxsize:
+                del self._data[next(iter(self._data))]
+            self._data[key] = (now + self.ttl, value)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._data.clear()
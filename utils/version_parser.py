@@ -4,11 +4,20 @@ Utility functions for parsing version information from pip requests
 
 import re
 import logging
+from functools import lru_cache
 from typing import Tuple, Optional
+from packaging.version import Version, InvalidVersion
 
 logger = logging.getLogger(__name__)
 
+# Patterns used on every pip request, compiled once
+PYTHON_VERSION_RE = re.compile(r'(?:CPython|Python)/(\d+\.\d+\.\d+)')
+VERSION_NUMBER_RE = re.compile(r'(\d+\.\d+\.\d+)')
+EXTRAS_RE = re.compile(r'\[.*?\]')
+PACKAGE_SPEC_RE = re.compile(r'^([a-zA-Z0-9_.-]+)(==|>=|<=|>|<|~=)(.+)$')
 
+
+@lru_cache(maxsize=2048)
 def parse_python_version(user_agent: str) -> Optional[str]:
     """
     Extract Python version from pip User-Agent header
@@ -23,18 +32,20 @@ def parse_python_version(user_agent: str) -> Optional[str]:
 
     Returns:
         Python version string (e.g., "3.11.0") or None if not found
+
+    Memoized: the same few pip/CI User-Agents arrive on every request.
     """
     if not user_agent:
         return None
 
     try:
         # Pattern: CPython/3.11.0 or Python/3.11.0
-        match = re.search(r'(?:CPython|Python)/(\d+\.\d+\.\d+)', user_agent)
+        match = PYTHON_VERSION_RE.search(user_agent)
         if match:
             return match.group(1)
 
         # Fallback: just the version number pattern
-        match = re.search(r'(\d+\.\d+\.\d+)', user_agent)
+        match = VERSION_NUMBER_RE.search(user_agent)
         if match:
             return match.group(1)
 
@@ -44,6 +55,7 @@ def parse_python_version(user_agent: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=2048)
 def parse_package_and_version(package_name: str) -> Tuple[str, Optional[str]]:
     """
     Parse package name and version from pip request
@@ -59,16 +71,23 @@ def parse_package_and_version(package_name: str) -> Tuple[str, Optional[str]]:
 
     Returns:
         Tuple of (package_name, version)
+
+    Memoized: resolvers request the same package paths over and over.
     """
     if not package_name:
         return ("", None)
 
     try:
         # Remove extras like [security]
-        package_name = re.sub(r'\[.*?\]', '', package_name)
+        if '[' in package_name:
+            package_name = EXTRAS_RE.sub('', package_name)
+
+        # Plain names (the common case) have no operator characters at all
+        if not any(c in package_name for c in '=<>~'):
+            return (package_name.strip(), None)
 
         # Check for version specifiers: ==, >=, <=, >, <, ~=
-        match = re.search(r'^([a-zA-Z0-9_.-]+)(==|>=|<=|>|<|~=)(.+)$', package_name)
+        match = PACKAGE_SPEC_RE.search(package_name)
         if match:
             name = match.group(1).strip()
             operator = match.group(2)
@@ -90,6 +109,24 @@ def parse_package_and_version(package_name: str) -> Tuple[str, Optional[str]]:
         return (package_name, None)
 
 
+@lru_cache(maxsize=8192)
+def version_sort_key(version: str) -> tuple:
+    """
+    Sort key ordering release strings by PEP 440 semantics
+
+    Examples:
+        sorted(["1.9", "1.10", "1.10rc1"], key=version_sort_key) -> ["1.9", "1.10rc1", "1.10"]
+
+    Strings that are not valid PEP 440 versions sort before all valid ones,
+    in plain string order. Parsed keys are memoized, since the same release
+    lists are sorted again on every request.
+    """
+    try:
+        return (1, Version(version), version)
+    except InvalidVersion:
+        return (0, None, version)
+
+
 def normalize_version(version: Optional[str]) -> str:
     """
     Normalize version string for database storage